@@ -0,0 +1,6 @@
+@echo off
+cd /d "%~dp0"
+echo Dang dong goi texture atlas...
+python client/atlas.py
+echo.
+pause
@@ -0,0 +1,6 @@
+@echo off
+cd /d "%~dp0"
+echo Dang do suc chua server (bat server voi --soak truoc)...
+python server/capacity.py %*
+echo.
+pause
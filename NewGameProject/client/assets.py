@@ -0,0 +1,102 @@
+import os
+import queue
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from logsetup import kv
+
+log = logging.getLogger('client.assets')
+
+class AssetLoader:
+    # Decodes images on worker threads (pygame's image decoders release the GIL)
+    # and converts them on the main thread in poll(), since convert() needs the
+    # display. Progress is reported in source bytes so big PNGs weigh more.
+    # With a PixelCache, entries added with cache=True skip decoding (and their
+    # prepare step) on warm starts.
+    def __init__(self, workers=4, on_decoded=None, cache=None):
+        self.workers = workers
+        self.on_decoded = on_decoded # Called from worker threads, e.g. to wake the main loop
+        self.cache = cache # pixelcache.PixelCache or None
+        self.entries = {} # name -> (path, alpha, size_bytes)
+        self.prepare = {} # name -> (prepare fn or None, cached, cache key)
+        self.surfaces = {} # name -> converted Surface (None if missing/failed)
+        self.results = queue.Queue()
+        self.total_bytes = 0
+        self.loaded_bytes = 0
+        self.executor = None
+
+    def add(self, name, path, alpha=False, prepare=None, cache=False, cache_key=None):
+        # prepare(surface) -> surface runs on the worker thread after decoding
+        # (cropping/scaling); it must not need the display. cache_key holds its
+        # parameters so the pixel cache misses when they change.
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.entries[name] = (path, alpha, size)
+        self.prepare[name] = (prepare, cache, cache_key)
+        self.total_bytes += size
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="AssetLoader")
+        # Largest first so the long decodes overlap with everything else
+        for name, (path, alpha, size) in sorted(self.entries.items(), key=lambda e: -e[1][2]):
+            self.executor.submit(self.decode, name, path)
+
+    def decode(self, name, path):
+        surf, error = None, None
+        prepare, cached, cache_key = self.prepare[name]
+        def build():
+            surf = pygame.image.load(path)
+            return prepare(surf) if prepare else surf
+        try:
+            if cached and self.cache:
+                surf = self.cache.get(name, path, build, self.entries[name][1], cache_key)
+            elif os.path.exists(path):
+                surf = build()
+        except Exception as e:
+            error = e
+        self.results.put((name, surf, error))
+        if self.on_decoded:
+            self.on_decoded()
+
+    def poll(self, block=False):
+        # Convert whatever finished decoding. Returns names that completed this call.
+        done = []
+        while len(self.surfaces) < len(self.entries):
+            try:
+                # Block (if asked) only for the first result
+                name, surf, error = self.results.get(block=block and not done)
+            except queue.Empty:
+                break
+            path, alpha, size = self.entries[name]
+            if error:
+                log.error("Failed to load image", extra=kv(path=path, error=error))
+            if surf is not None:
+                surf = surf.convert_alpha() if alpha else surf.convert()
+            self.surfaces[name] = surf
+            self.loaded_bytes += size
+            done.append(name)
+        if self.is_complete() and self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        return done
+
+    def ready(self, names):
+        return all(name in self.surfaces for name in names)
+
+    def is_complete(self):
+        return len(self.surfaces) == len(self.entries)
+
+    def wait(self, names=None):
+        # Block until the given names (default: everything) are converted
+        names = self.entries if names is None else names
+        while not self.ready(names):
+            self.poll(block=True)
+
+    def progress(self):
+        if not self.total_bytes:
+            return 1.0 if self.is_complete() else 0.0
+        return self.loaded_bytes / self.total_bytes
+
+    def get(self, name):
+        return self.surfaces.get(name)
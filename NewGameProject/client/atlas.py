@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import logging
+
+import pygame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common')) # For game_engine's logsetup import when run as a script
+from logsetup import kv
+from game_engine import TILE_SIZE, MAP_ASSETS, VEG_SIZES, CHAR_SHEETS, CHAR_FRAME
+
+log = logging.getLogger('client.assets')
+
+# Baked by bake_assets.bat (python client/atlas.py from the project folder)
+ATLAS_IMAGE = "assets/atlas.png"
+ATLAS_INDEX = "assets/atlas.json"
+ATLAS_VERSION = 1
+ATLAS_WIDTH = 1024
+# Pre-scaled copies per asset, covering the camera zoom range (0.5x - 2x)
+MIP_LEVELS = (0.5, 1.0, 2.0)
+PADDING = 1 # Transparent gutter so scaling one entry never bleeds into its neighbour
+
+def atlas_sources():
+    # name -> (source path, crop rect or None, base size at zoom 1.0)
+    sources = {}
+    for name, (path, alpha) in MAP_ASSETS.items():
+        sources['map/' + name] = (path, None, VEG_SIZES.get(name, (TILE_SIZE, TILE_SIZE)))
+    for name, path in CHAR_SHEETS.items():
+        sources['char/' + name] = (path, CHAR_FRAME, (CHAR_FRAME[2], CHAR_FRAME[3]))
+    return sources
+
+def prepare_source(src, crop, size):
+    # Crop a sheet to its frame and scale it to its zoom 1.0 size (no display needed)
+    if crop and src.get_width() >= crop[2] and src.get_height() >= crop[3]:
+        src = src.subsurface(crop)
+    if src.get_size() == tuple(size):
+        return src
+    if src.get_bitsize() in (24, 32):
+        return pygame.transform.smoothscale(src, size)
+    return pygame.transform.scale(src, size)
+
+def source_stamp(path):
+    # Cheap staleness check without reading the file
+    st = os.stat(path)
+    return [st.st_size, int(st.st_mtime)]
+
+def bake(image_path=ATLAS_IMAGE, index_path=ATLAS_INDEX):
+    # Load every source once, crop/scale it to each mip level and shelf-pack the
+    # results into a single RGBA image plus a JSON index of rects.
+    items = []
+    stamps = {}
+    for name, (path, crop, (base_w, base_h)) in atlas_sources().items():
+        src = pygame.image.load(path)
+        stamps[path] = source_stamp(path)
+        if crop and src.get_width() >= crop[2] and src.get_height() >= crop[3]:
+            src = src.subsurface(crop)
+        src = src.convert_alpha() if pygame.display.get_surface() else src
+        for level in MIP_LEVELS:
+            size = (max(1, int(base_w * level)), max(1, int(base_h * level)))
+            items.append((name, level, pygame.transform.smoothscale(src, size)))
+
+    # Shelf packing, tallest first
+    items.sort(key=lambda item: -item[2].get_height())
+    rects = []
+    x = y = shelf_h = 0
+    for name, level, surf in items:
+        w, h = surf.get_width() + PADDING, surf.get_height() + PADDING
+        if x + w > ATLAS_WIDTH:
+            x, y, shelf_h = 0, y + shelf_h, 0
+        rects.append((name, level, surf, (x, y)))
+        x += w
+        shelf_h = max(shelf_h, h)
+
+    atlas = pygame.Surface((ATLAS_WIDTH, y + shelf_h), pygame.SRCALPHA)
+    index = {"version": ATLAS_VERSION, "tile_size": TILE_SIZE, "sources": stamps, "entries": {}}
+    for name, level, surf, pos in rects:
+        atlas.blit(surf, pos)
+        index["entries"].setdefault(name, {})[str(level)] = [pos[0], pos[1], surf.get_width(), surf.get_height()]
+
+    pygame.image.save(atlas, image_path)
+    with open(index_path, "w") as f:
+        json.dump(index, f, indent=1)
+    return index
+
+class Atlas:
+    def __init__(self, index):
+        self.index = index
+        self.image = None # Set by the client once the AssetLoader has decoded the atlas PNG
+
+    def get(self, name, level=1.0):
+        x, y, w, h = self.index["entries"][name][str(level)]
+        return self.image.subsurface((x, y, w, h))
+
+    def group(self, prefix):
+        # {short name: base-level surface} for every entry under prefix
+        return {name[len(prefix):]: self.get(name) for name in self.index["entries"] if name.startswith(prefix)}
+
+    def mips(self, prefix):
+        # {short name: {level: surface}}
+        return {name[len(prefix):]: {level: self.get(name, level) for level in MIP_LEVELS}
+                for name in self.index["entries"] if name.startswith(prefix)}
+
+def load_index():
+    # Returns an Atlas (image not yet decoded) if a baked atlas exists and matches
+    # the current sources, else None so the caller loads the source PNGs instead.
+    if not (os.path.exists(ATLAS_IMAGE) and os.path.exists(ATLAS_INDEX)):
+        return None
+    try:
+        with open(ATLAS_INDEX, "r") as f:
+            index = json.load(f)
+        if index.get("version") != ATLAS_VERSION or index.get("tile_size") != TILE_SIZE:
+            log.info("Texture atlas is from another version, using source images.")
+            return None
+        for name, (path, crop, size) in atlas_sources().items():
+            if name not in index["entries"] or index["sources"].get(path) != source_stamp(path):
+                log.info("Texture atlas is stale, using source images.", extra=kv(changed=path))
+                return None
+        return Atlas(index)
+    except (OSError, ValueError, KeyError) as e:
+        log.error("Failed to read texture atlas index", extra=kv(path=ATLAS_INDEX, error=e))
+        return None
+
+if __name__ == "__main__":
+    # python client/atlas.py  (from the project folder, see bake_assets.bat)
+    pygame.init()
+    pygame.display.set_mode((1, 1), pygame.HIDDEN)
+    index = bake()
+    print(f"Baked {len(index['entries'])} assets into {ATLAS_IMAGE}")
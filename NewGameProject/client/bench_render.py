@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import platform
+import time
+
+# Render-loop benchmark: runs the real handle_game() headless over a scripted
+# camera path and zoom sweep with a synthetic crowd, and reports per-stage
+# frame-time percentiles from the FrameProfiler.
+#
+#   python client/bench_render.py                  # compare with bench_render_baseline.json
+#   python client/bench_render.py --save-baseline
+#   python client/bench_render.py --crowd 500 --hour 22 --frames 1200
+#   python client/bench_render.py --memory         # GC pauses and top allocation sites (no baseline check)
+#
+# Exits with 1 if a stage's p50 regresses past the threshold. Baselines are machine specific.
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CLIENT_DIR)
+os.chdir(os.path.dirname(CLIENT_DIR)) # Asset paths are relative to the project folder
+
+import logging
+logging.disable(logging.INFO) # main.py logs to stdout at DEBUG
+
+import main as client
+from game_engine import TILE_SIZE, CHUNK_SIZE
+
+BASELINE_PATH = os.path.join(CLIENT_DIR, "bench_render_baseline.json")
+DEFAULT_THRESHOLD = 0.25
+MIN_GUARDED_MS = 0.1 # Stages cheaper than this are too noisy to guard
+PATH_RADIUS = 1200 # World px; the camera loops a figure eight of this size
+APPEARANCE = {"body": 0, "hair": 1, "shirt": 1, "pants": 0, "eyes": 0}
+
+def camera_path(frame, frames):
+    # Figure eight around the spawn point, one loop per run
+    t = 2 * math.pi * frame / frames
+    return 400 + math.sin(t) * PATH_RADIUS, 300 + math.sin(2 * t) * PATH_RADIUS / 2
+
+def zoom_sweep(frame, frames):
+    # 1.0 -> 2.0 -> 0.5 -> 1.0 twice per run
+    return 1.25 + 0.75 * math.sin(4 * math.pi * frame / frames)
+
+def make_client(crowd, hour, seed):
+    random.seed(seed)
+    g = client.GameClient()
+    while g.state == "LOADING":
+        g.update_loading()
+    g.state = "GAME"
+    g.asset_loader.wait()
+    while not g.assets_done:
+        g.poll_assets()
+    g.username = "bench"
+    g.my_appearance = dict(APPEARANCE)
+    g.connected = True # No HUD warning; MOVEs are dropped since there is no socket
+    g.send_json = lambda data: None
+    g.day_night.time = hour
+    g.day_night.speed = 0.0
+
+    # Whole path generated up front so streaming doesn't show up as placeholder frames
+    radius = PATH_RADIUS // (TILE_SIZE * CHUNK_SIZE) + 2
+    g.map_system.generate_around((400, 300), radius)
+
+    rng = random.Random(seed)
+    g.other_players = {
+        str(i): {'pos': {'x': 400 + rng.uniform(-PATH_RADIUS, PATH_RADIUS), 'y': 300 + rng.uniform(-PATH_RADIUS / 2, PATH_RADIUS / 2)},
+                 'appearance': {"body": 0, "hair": rng.randint(0, 1), "shirt": rng.randint(0, 1), "pants": 0, "eyes": 0},
+                 'username': f"player_{i}"}
+        for i in range(crowd)
+    }
+    return g
+
+def run(frames, crowd, hour, seed=1, warmup=60, memory=False):
+    g = make_client(crowd, hour, seed)
+    if memory:
+        g.profiler.attach_memory(trace=True)
+    g.scheduler.raw_dt = 1.0 / 60
+    rng = random.Random(seed)
+    others = list(g.other_players.values())
+    for frame in range(-warmup, frames):
+        if frame == 0:
+            g.profiler.reset()
+            g.profiler.enabled = True
+        pos = camera_path(frame, frames)
+        g.player_pos[:] = pos
+        g.prev_player_pos[:] = pos
+        g.camera.set_zoom(zoom_sweep(frame, frames))
+        # The crowd shuffles around like network updates would
+        for p in others[frame % 10::10]:
+            p['pos'] = {'x': p['pos']['x'] + rng.uniform(-8, 8), 'y': p['pos']['y'] + rng.uniform(-8, 8)}
+        g.profiler.begin_frame()
+        g.handle_game()
+    report = g.profiler.report()
+    if memory:
+        summary = g.profiler.memory.summary()
+        print("memory: " + ", ".join(f"{k} {v}" for k, v in summary.items()))
+        print("top allocation sites (live blocks added over the run):")
+        for site, blocks, size in g.profiler.memory.top_sites(15):
+            print(f"  {site:32s} {blocks:+8d} blocks {size / 1024:+10.1f} KB")
+        g.profiler.memory.stop()
+    g.map_system.shutdown()
+    return report
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for stage, current in results.items():
+        base = baseline.get("results", {}).get(stage)
+        if base and base["p50"] >= MIN_GUARDED_MS and current["p50"] > base["p50"] * (1 + threshold):
+            regressions.append((stage, base["p50"], current["p50"]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Client render-loop benchmark")
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--crowd', type=int, default=200, help="Other players in the world")
+    parser.add_argument('--hour', type=float, default=12.0, help="Time of day (night enables lighting)")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--json', help="Write results to this file")
+    parser.add_argument('--memory', action='store_true', help="Trace GC and allocations (slows frames; skips the baseline check)")
+    args = parser.parse_args(argv)
+
+    results = run(args.frames, args.crowd, args.hour, memory=args.memory)
+    print(f"{'stage':18s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'mean':>9s}   (ms, {args.frames} frames, crowd {args.crowd})")
+    for stage, r in results.items():
+        print(f"{stage:18s} {r['p50']:9.3f} {r['p95']:9.3f} {r['p99']:9.3f} {r['mean']:9.3f}")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "frames": args.frames, "crowd": args.crowd, "hour": args.hour,
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.memory:
+        return 0
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against (run with --save-baseline)")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    meta = baseline.get("meta", {})
+    if (meta.get("frames"), meta.get("crowd"), meta.get("hour")) != (args.frames, args.crowd, args.hour):
+        print("Baseline was recorded with different --frames/--crowd/--hour; not comparing")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for stage, base, current in regressions:
+        print(f"REGRESSION {stage}: p50 {base:.3f} ms -> {current:.3f} ms ({current / base - 1:+.0%})")
+    if regressions:
+        return 1
+    print(f"No regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
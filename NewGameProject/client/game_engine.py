@@ -3,55 +3,174 @@ import random
 import json
 import os
 import math
-import time
+import threading
+import queue
+import sqlite3
+import tempfile
+import struct
+import zlib
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from render import SurfaceCache
+from logsetup import kv
+
+log = logging.getLogger('client.world')
 
 TILE_SIZE = 64
 CHUNK_SIZE = 16 # tiles per chunk axis (16x16)
 
+# Stable type IDs for compact chunk serialization
+TILE_TYPES = ['grass', 'dirt', 'water']
+VEG_TYPES = ['tree', 'flower']
+VEG_RECORD = struct.Struct('<iiBf') # x, y, type id, sway phase
+
+# Map asset name -> (path, has_alpha)
+MAP_ASSETS = {
+    'grass': ("assets/tiles/grass.png", False),
+    'dirt': ("assets/tiles/dirt.png", False),
+    'water': ("assets/tiles/water.png", False),
+    # Vegetation
+    'tree': ("assets/tiles/tree.png", True),
+    'flower': ("assets/tiles/flower_grass.png", True),
+}
+CHAR_SHEETS = {
+    'body': "assets/character/body.png",
+    'hair': "assets/character/hair.png",
+    'armor': "assets/character/armor.png",
+}
+CHAR_FRAME = (0, 0, 64, 128) # First frame of each character sheet
+VEG_SIZES = {'tree': (TILE_SIZE * 2, TILE_SIZE * 2), 'flower': (TILE_SIZE, TILE_SIZE)} # World size in px
+
 class DayNightCycle:
+    ALPHA_BUCKET = 4 # Darkness only changes in steps of this, so the ambient colour rarely changes
+
     def __init__(self, screen_width, screen_height):
         self.time = 12.0 # 0-24
-        self.speed = 1.0 # Real seconds per game hour (tuned for play)
+        self.speed = 0.1 # Game hours per real second (a 4 minute day)
         self.width = screen_width
         self.height = screen_height
-        self.overlay = pygame.Surface((screen_width, screen_height))
         self.color = (0, 0, 50) # Deep blue night
         
     def update(self, dt):
         self.time += dt * self.speed
-        if self.time >= 24: self.time = 0
+        if self.time >= 24: self.time -= 24
         
-    def get_darkness(self):
-        # 6-18 is day (alpha 0). 18-6 is night (alpha ramps to 200).
+    def get_alpha(self):
+        # 7-18 is day (alpha 0). Dusk ramps to 150, night is 180, dawn ramps back.
         alpha = 0
         if 18 <= self.time < 20: # Dusk
             alpha = (self.time - 18) / 2 * 150
-        elif 20 <= self.time < 5: # Night
+        elif self.time >= 20 or self.time < 5: # Night
             alpha = 180
         elif 5 <= self.time < 7: # Dawn
             alpha = 180 - (self.time - 5) / 2 * 180
+        return int(alpha) // self.ALPHA_BUCKET * self.ALPHA_BUCKET
             
-        self.overlay.set_alpha(int(alpha))
-        self.overlay.fill(self.color)
-        return self.overlay, int(alpha)
+    def get_ambient(self):
+        # Light-map fill for this darkness: white by day, fading towards the night
+        # colour as alpha rises. LightMap multiplies the scene by it, so the scene
+        # is only darkened and tinted; the night colour is never blended on top
+        # the way the old alpha overlay did.
+        alpha = self.get_alpha()
+        return tuple(int(255 - alpha + c * alpha / 255) for c in self.color)
+
+class VegetationIndex:
+    # Vegetation of one chunk in flat arrays, sorted by (y, x) in tile coords.
+    # row_start[ly]..row_start[ly + 1] is the slice for local tile row ly, so a
+    # rectangle query is a bisect per row and results come out already y-sorted.
+    def __init__(self, base_ty, entries=()):
+        # entries: (x, y, type_id, sway_phase)
+        entries = sorted(entries, key=lambda e: (e[1], e[0]))
+        self.base_ty = base_ty
+        self.x = array('i', [e[0] for e in entries])
+        self.y = array('i', [e[1] for e in entries])
+        self.type_id = array('B', [e[2] for e in entries])
+        self.sway = array('f', [e[3] for e in entries])
+        self.row_start = array('i', [0] * (CHUNK_SIZE + 1))
+        for e in entries:
+            self.row_start[e[1] - base_ty + 1] += 1
+        for ly in range(CHUNK_SIZE):
+            self.row_start[ly + 1] += self.row_start[ly]
+
+    def __len__(self):
+        return len(self.x)
+
+    def entries(self):
+        return zip(self.x, self.y, self.type_id, self.sway)
+
+    def query_row(self, ty, tx0, tx1, out):
+        # Append entries on tile row ty with tx0 <= x <= tx1 (inclusive) to out
+        ly = ty - self.base_ty
+        lo, hi = self.row_start[ly], self.row_start[ly + 1]
+        if lo == hi:
+            return
+        xs = self.x
+        i0 = bisect_left(xs, tx0, lo, hi)
+        i1 = bisect_right(xs, tx1, i0, hi)
+        for i in range(i0, i1):
+            out.append(xs[i], self.y[i], self.type_id[i], self.sway[i])
 
-class Vegetation:
-    def __init__(self, x, y, type_name):
-        self.x = x
-        self.y = y
-        self.type = type_name # 'tree', 'flower'
-        self.sway_offset = random.uniform(0, 6.28) # Random phase
+    def query(self, tx0, ty0, tx1, ty1, out):
+        # Inclusive tile rect, clipped to this chunk's rows
+        for ty in range(max(ty0, self.base_ty), min(ty1, self.base_ty + CHUNK_SIZE - 1) + 1):
+            self.query_row(ty, tx0, tx1, out)
+
+class VegetationBuffer:
+    # Reusable query result (same fields as VegetationIndex). Only grows, so once
+    # warmed up a frame's vegetation query allocates nothing.
+    def __init__(self, capacity=256):
+        self.x = array('i', [0]) * capacity
+        self.y = array('i', [0]) * capacity
+        self.type_id = array('B', [0]) * capacity
+        self.sway = array('f', [0.0]) * capacity
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def append(self, x, y, type_id, sway):
+        n = self.count
+        if n == len(self.x):
+            for a in (self.x, self.y, self.type_id, self.sway):
+                a.extend(a) # Double capacity
+        self.x[n] = x
+        self.y[n] = y
+        self.type_id[n] = type_id
+        self.sway[n] = sway
+        self.count = n + 1
 
 class Chunk:
-    def __init__(self, cx, cy):
+    def __init__(self, cx, cy, generate=True):
         self.cx = cx
         self.cy = cy
         self.tiles = {} # (x, y) -> tile_type
-        self.vegetation = [] # List of Vegetation
-        self.generate()
+        self.vegetation = VegetationIndex(cy * CHUNK_SIZE)
+        if generate:
+            self.generate()
+
+    def to_bytes(self):
+        # Tiles as one type-id byte each (row-major), then packed vegetation records
+        tiles = bytes(TILE_TYPES.index(self.tiles[(x, y)]) for y in range(CHUNK_SIZE) for x in range(CHUNK_SIZE))
+        veg = b''.join(VEG_RECORD.pack(*e) for e in self.vegetation.entries())
+        return zlib.compress(tiles + veg)
+
+    @classmethod
+    def from_bytes(cls, cx, cy, data):
+        raw = zlib.decompress(data)
+        chunk = cls(cx, cy, generate=False)
+        n = CHUNK_SIZE * CHUNK_SIZE
+        for i in range(n):
+            chunk.tiles[(i % CHUNK_SIZE, i // CHUNK_SIZE)] = TILE_TYPES[raw[i]]
+        chunk.vegetation = VegetationIndex(cy * CHUNK_SIZE, VEG_RECORD.iter_unpack(raw[n:]))
+        return chunk
 
     def generate(self):
         # varied generation
+        veg = [] # (x, y, type_id, sway_phase)
         for y in range(CHUNK_SIZE):
             for x in range(CHUNK_SIZE):
                 # Global coords
@@ -69,9 +188,134 @@ class Chunk:
                     self.tiles[(x, y)] = "grass"
                     # Chance for veg
                     if random.random() < 0.05:
-                        self.vegetation.append(Vegetation(gx, gy, 'tree'))
+                        veg.append((gx, gy, VEG_TYPES.index('tree'), random.uniform(0, 6.28)))
                     elif random.random() < 0.2:
-                        self.vegetation.append(Vegetation(gx, gy, 'flower'))
+                        veg.append((gx, gy, VEG_TYPES.index('flower'), random.uniform(0, 6.28)))
+        self.vegetation = VegetationIndex(self.cy * CHUNK_SIZE, veg)
+
+class ChunkStore:
+    # SQLite cache for chunks evicted from memory. World gen is random per run,
+    # so the store is cleared on open and only lives for the session. Without a
+    # path each process gets its own temp file (two clients started from the
+    # same folder must not share one), deleted again on close.
+    # Only used from the streamer thread (sqlite connections are per-thread).
+    def __init__(self, path=None):
+        self.path = path
+        self.temporary = False
+        self.conn = None
+
+    def open(self):
+        try:
+            if self.path is None:
+                fd, self.path = tempfile.mkstemp(prefix="chunk_cache_", suffix=".db")
+                os.close(fd)
+                self.temporary = True
+            self.conn = sqlite3.connect(self.path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=OFF")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS chunks
+                                 (cx INTEGER, cy INTEGER, data BLOB, PRIMARY KEY (cx, cy))''')
+            self.conn.execute("DELETE FROM chunks")
+            self.conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            # No store: evicted chunks are simply regenerated
+            log.error("Chunk store unavailable", extra=kv(error=e))
+            self.conn = None
+
+    def save(self, chunk):
+        if not self.conn:
+            return
+        self.conn.execute("INSERT OR REPLACE INTO chunks (cx, cy, data) VALUES (?, ?, ?)",
+                          (chunk.cx, chunk.cy, chunk.to_bytes()))
+        self.conn.commit()
+
+    def load(self, cx, cy):
+        if not self.conn:
+            return None
+        row = self.conn.execute("SELECT data FROM chunks WHERE cx = ? AND cy = ?", (cx, cy)).fetchone()
+        if row:
+            return Chunk.from_bytes(cx, cy, row[0])
+        return None
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+        if self.temporary:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.path + suffix)
+                except OSError:
+                    pass
+            self.temporary = False
+
+class ChunkStreamer:
+    # Generates chunks on a background thread so rendering never blocks on world gen.
+    # Requests are prioritised (lower first); finished chunks come back through a queue
+    # and are picked up by the main thread in Map.update().
+    # Evicted chunks are written to the ChunkStore by the same thread and reloaded from it.
+    def __init__(self, store=None):
+        self.store = store or ChunkStore()
+        self.requests = queue.PriorityQueue()
+        self.results = queue.Queue()
+        self.pending = set() # Keys queued or in-flight (main thread only)
+        self.seq = 0 # Tie-breaker so equal priorities stay FIFO
+        self.running = True
+        self.thread = threading.Thread(target=self.worker, name="ChunkStreamer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def request(self, cx, cy, priority=0):
+        key = (cx, cy)
+        if key in self.pending:
+            return
+        self.pending.add(key)
+        self.seq += 1
+        self.requests.put((priority, self.seq, key, None))
+
+    def evict(self, chunk):
+        # Saves run before any queued load so a quick return finds the stored copy
+        self.seq += 1
+        self.requests.put((-1, self.seq, (chunk.cx, chunk.cy), chunk))
+
+    def worker(self):
+        self.store.open()
+        while self.running:
+            priority, seq, key, evicted = self.requests.get()
+            if key is None: # Stop sentinel
+                break
+            if evicted is not None:
+                try:
+                    self.store.save(evicted)
+                except sqlite3.Error as e:
+                    log.error("Chunk save failed", extra=kv(chunk=key, error=e))
+                continue
+            try:
+                chunk = self.store.load(key[0], key[1]) or Chunk(key[0], key[1])
+            except Exception as e:
+                log.error("Chunk generation failed", extra=kv(chunk=key, error=e))
+                chunk = None
+            self.results.put((key, chunk))
+        self.store.close()
+
+    def collect(self):
+        # Drain finished chunks (main thread)
+        done = []
+        while True:
+            try:
+                key, chunk = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.discard(key)
+            if chunk is not None:
+                done.append((key, chunk))
+        return done
+
+    def stop(self):
+        self.running = False
+        self.requests.put((-2, 0, None, None))
+        # Let the worker close the store (and delete its file) before the process exits
+        self.thread.join(timeout=2.0)
 
 class Camera:
     def __init__(self, width, height):
@@ -138,39 +382,100 @@ class Camera:
 
 # Duplicate Chunk class removed
 
-class Firefly:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.float_offset = random.uniform(0, 100)
-        self.color = (200, 255, 100) # Greenish yellow
-        self.size = random.randint(2, 4)
-        
-    def update(self, dt):
-        # Float around
-        self.x += math.sin(time.time() + self.float_offset) * 0.5
-        self.y += math.cos(time.time() * 0.5 + self.float_offset) * 0.5
+class View:
+    # Per-frame visibility query. Built once from the Camera (after camera.update)
+    # and shared by every render pass so the screen->world maths runs once per frame.
+    # offset_x/offset_y shift the view in world pixels (used for prefetch look-ahead).
+    def __init__(self, camera, offset_x=0, offset_y=0):
+        self.zoom = camera.zoom_level
+        self.width = camera.width
+        self.height = camera.height
+
+        # Inverse of Camera.apply_pos:
+        # x_world = ((x_screen - cx) / zoom) + cx - cam_x
+        cx_scr, cy_scr = camera.width // 2, camera.height // 2
+        self.min_wx = (-cx_scr / self.zoom) + cx_scr - camera.camera.x + offset_x
+        self.min_wy = (-cy_scr / self.zoom) + cy_scr - camera.camera.y + offset_y
+        self.max_wx = ((camera.width - cx_scr) / self.zoom) + cx_scr - camera.camera.x + offset_x
+        self.max_wy = ((camera.height - cy_scr) / self.zoom) + cy_scr - camera.camera.y + offset_y
+
+        # Tile rect (inclusive), padded by one so partially visible edge tiles are drawn
+        self.start_tx = int(self.min_wx // TILE_SIZE) - 1
+        self.start_ty = int(self.min_wy // TILE_SIZE) - 1
+        self.end_tx = int(self.max_wx // TILE_SIZE) + 1
+        self.end_ty = int(self.max_wy // TILE_SIZE) + 1
+
+        # Chunk rect (inclusive)
+        self.start_cx = self.start_tx // CHUNK_SIZE
+        self.start_cy = self.start_ty // CHUNK_SIZE
+        self.end_cx = self.end_tx // CHUNK_SIZE
+        self.end_cy = self.end_ty // CHUNK_SIZE
+
+        self.chunks = [(cx, cy) for cy in range(self.start_cy, self.end_cy + 1)
+                                for cx in range(self.start_cx, self.end_cx + 1)]
+
+    def center_chunk(self):
+        return (self.start_cx + self.end_cx) / 2, (self.start_cy + self.end_cy) / 2
+
+    def has_chunk(self, cx, cy):
+        return self.start_cx <= cx <= self.end_cx and self.start_cy <= cy <= self.end_cy
 
 class Map:
-    def __init__(self, screen_width, screen_height):
+    # Chunk placeholder colour while the streamer is still generating it
+    PLACEHOLDER_COLOR = (40, 70, 40)
+    # Seconds of movement to look ahead when prefetching chunks
+    PREFETCH_LOOKAHEAD = 1.5
+
+    def __init__(self, screen_width, screen_height, resident_budget=96):
         self.chunks = {} # (cx, cy) -> Chunk
         self.assets = {} # Loaded explicitly later
+        self.streamer = ChunkStreamer()
+        self.resident_budget = resident_budget # Max chunks kept in memory
+        self.frame = 0
+        self.last_used = {} # (cx, cy) -> frame the chunk was last in view
+        self.veg_extent = (0, 0) # Tiles a vegetation sprite reaches right/up at any zoom
+        self.visible_veg = VegetationBuffer() # Reused by get_visible_vegetation
+        self.mips = {} # name -> {level: Surface}, level 1.0 = self.assets[name]
+        self.scaled = SurfaceCache(64) # (name, w, h) -> Surface at the current zoom
 
-    def load_assets(self):
-        # Load assets
+    def load_assets(self, images=None, mips=None):
+        # images: optional name -> converted Surface (e.g. from an AssetLoader);
+        # anything missing is loaded from disk here.
+        # mips: optional name -> {level: Surface} from a baked atlas (atlas.py),
+        # already at the right sizes, in which case images is ignored.
+        images = images or {}
+        self.scaled.clear()
+        if mips:
+            self.mips = mips
+            for k in MAP_ASSETS:
+                self.assets[k] = mips[k][1.0]
+            self.veg_extent = (
+                max(self.assets[k].get_width() for k in VEG_TYPES) // TILE_SIZE + 1,
+                max(self.assets[k].get_height() for k in VEG_TYPES) // TILE_SIZE + 1,
+            )
+            return
         try:
-            self.assets['grass'] = pygame.image.load("assets/tiles/grass.png").convert()
-            self.assets['dirt'] = pygame.image.load("assets/tiles/dirt.png").convert()
-            self.assets['water'] = pygame.image.load("assets/tiles/water.png").convert()
-            # Vegetation
-            self.assets['tree'] = pygame.image.load("assets/tiles/tree.png").convert_alpha()
-            self.assets['flower'] = pygame.image.load("assets/tiles/flower_grass.png").convert_alpha()
+            for k, (path, alpha) in MAP_ASSETS.items():
+                surf = images.get(k)
+                if surf is None:
+                    surf = pygame.image.load(path)
+                    surf = surf.convert_alpha() if alpha else surf.convert()
+                self.assets[k] = surf
             
-            # Scale if needed, assuming 64x64 for tiles
+            # Scale if needed (the AssetLoader usually hands them over pre-scaled)
             for k in ['grass', 'dirt', 'water']:
-                self.assets[k] = pygame.transform.scale(self.assets[k], (TILE_SIZE, TILE_SIZE))
+                if self.assets[k].get_size() != (TILE_SIZE, TILE_SIZE):
+                    self.assets[k] = pygame.transform.scale(self.assets[k], (TILE_SIZE, TILE_SIZE))
+            for k, size in VEG_SIZES.items():
+                if self.assets[k].get_size() != size:
+                    self.assets[k] = pygame.transform.smoothscale(self.assets[k], size)
+            self.veg_extent = (
+                max(self.assets[k].get_width() for k in VEG_TYPES) // TILE_SIZE + 1,
+                max(self.assets[k].get_height() for k in VEG_TYPES) // TILE_SIZE + 1,
+            )
+            self.mips = {k: {1.0: self.assets[k]} for k in MAP_ASSETS}
         except Exception as e:
-            print(f"Error loading tiles: {e}")
+            log.error("Error loading tiles", extra=kv(error=e))
             # Fallback colors
             self.assets['grass'] = (50, 200, 50)
             self.assets['dirt'] = (150, 100, 50)
@@ -178,93 +483,132 @@ class Map:
             self.assets['tree'] = (0, 100, 0)
             self.assets['flower'] = (255, 255, 0)
 
+    def get_scaled(self, name, w, h):
+        # Asset scaled to w x h, cached so a steady zoom costs one scale per asset.
+        # Scales down from the smallest mip at least that big, which is sharper and
+        # cheaper than scaling the full-size image.
+        def build():
+            levels = self.mips.get(name) or {1.0: self.assets[name]}
+            fits = [m for m in levels.values() if m.get_width() >= w]
+            src = min(fits, key=lambda m: m.get_width()) if fits else max(levels.values(), key=lambda m: m.get_width())
+            if src.get_size() == (w, h):
+                return src
+            return pygame.transform.scale(src, (w, h))
+        return self.scaled.get((name, w, h), build)
+
     def get_chunk(self, cx, cy):
+        # Non-blocking: returns None (and queues generation) if the chunk isn't ready yet
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None:
+            self.streamer.request(cx, cy)
+        return chunk
+
+    def generate_now(self, cx, cy):
+        # Synchronous generation, for loading screens only
         if (cx, cy) not in self.chunks:
             self.chunks[(cx, cy)] = Chunk(cx, cy)
         return self.chunks[(cx, cy)]
 
-    def draw(self, screen, camera):
-        # Determine visible chunks with zoom
-        # Effective tile size
-        eff_tile = int(TILE_SIZE * camera.zoom_level)
-        if eff_tile < 1: eff_tile = 1
-        
-        # Inverse view to get world bounds
-        # Screen (0,0) -> World ?
-        # x_screen = (x_world + cam_x - cx) * zoom + cx
-        # x_world = ((x_screen - cx) / zoom) + cx - cam_x
-        
-        cx_scr, cy_scr = camera.width // 2, camera.height // 2
-        
-        def screen_to_world(sx, sy):
-            wx = ((sx - cx_scr) / camera.zoom_level) + cx_scr - camera.camera.x
-            wy = ((sy - cy_scr) / camera.zoom_level) + cy_scr - camera.camera.y
-            return wx, wy
+    def generate_around(self, pos, radius=1):
+        ccx = int(pos[0] // TILE_SIZE // CHUNK_SIZE)
+        ccy = int(pos[1] // TILE_SIZE // CHUNK_SIZE)
+        for cy in range(ccy - radius, ccy + radius + 1):
+            for cx in range(ccx - radius, ccx + radius + 1):
+                self.generate_now(cx, cy)
 
-        min_wx, min_wy = screen_to_world(0, 0)
-        max_wx, max_wy = screen_to_world(camera.width, camera.height)
-        
-        start_tx = int(min_wx // TILE_SIZE) - 1
-        start_ty = int(min_wy // TILE_SIZE) - 1
-        end_tx = int(max_wx // TILE_SIZE) + 1
-        end_ty = int(max_wy // TILE_SIZE) + 1
+    def update(self, camera, velocity=(0, 0), view=None):
+        view = view or View(camera)
+
+        # Pick up chunks finished by the streamer
+        for key, chunk in self.streamer.collect():
+            self.chunks[key] = chunk
+
+        # Visible ring first (priority 0), then where the player is heading (priority 1)
+        self.frame += 1
+        center_x, center_y = view.center_chunk()
+        for key in view.chunks:
+            self.last_used[key] = self.frame
+        for cy in range(view.start_cy - 1, view.end_cy + 2):
+            for cx in range(view.start_cx - 1, view.end_cx + 2):
+                if (cx, cy) not in self.chunks:
+                    dist = abs(cx - center_x) + abs(cy - center_y)
+                    self.streamer.request(cx, cy, dist if view.has_chunk(cx, cy) else 10 + dist)
+
+        vx, vy = velocity
+        if vx or vy:
+            ahead = View(camera, vx * self.PREFETCH_LOOKAHEAD, vy * self.PREFETCH_LOOKAHEAD)
+            for cx, cy in ahead.chunks:
+                if (cx, cy) not in self.chunks:
+                    self.streamer.request(cx, cy, 20)
+
+        if len(self.chunks) > self.resident_budget:
+            self.evict(center_x, center_y)
+
+    def evict(self, center_x, center_y):
+        # Drop the farthest chunks (least recently seen first on ties) down to the budget
+        def score(key):
+            dist = max(abs(key[0] - center_x), abs(key[1] - center_y))
+            return (dist, -self.last_used.get(key, 0))
+        # Chunks in view this frame are never evicted, whatever the budget
+        keys = sorted((k for k in self.chunks if self.last_used.get(k) != self.frame), key=score, reverse=True)
+        for key in keys[:len(self.chunks) - self.resident_budget]:
+            self.streamer.evict(self.chunks.pop(key))
+            self.last_used.pop(key, None)
+
+    def shutdown(self):
+        self.streamer.stop()
+
+    def draw(self, screen, camera, view=None):
+        view = view or View(camera)
+        scaled_size = int(TILE_SIZE * camera.zoom_level)
         
-        # Convert to chunks
-        start_cx = start_tx // CHUNK_SIZE
-        start_cy = start_ty // CHUNK_SIZE
-        end_cx = end_tx // CHUNK_SIZE
-        end_cy = end_ty // CHUNK_SIZE
-
-        for cy in range(start_cy, end_cy + 1):
-            for cx in range(start_cx, end_cx + 1):
-                chunk = self.get_chunk(cx, cy)
-                
-                for (lx, ly), t_type in chunk.tiles.items():
-                    gx = (cx * CHUNK_SIZE + lx) * TILE_SIZE
-                    gy = (cy * CHUNK_SIZE + ly) * TILE_SIZE
-                    
-                    scr_x, scr_y = camera.apply_pos(gx, gy)
+        for cx, cy in view.chunks:
+            chunk = self.get_chunk(cx, cy)
+            if chunk is None:
+                # Still streaming in: flat placeholder instead of stalling the frame
+                px, py = camera.apply_pos(cx * CHUNK_SIZE * TILE_SIZE, cy * CHUNK_SIZE * TILE_SIZE)
+                size = int(CHUNK_SIZE * TILE_SIZE * camera.zoom_level) + 1
+                pygame.draw.rect(screen, self.PLACEHOLDER_COLOR, (px, py, size, size))
+                continue
+            
+            # Only the part of the chunk inside the view's tile rect
+            base_tx = cx * CHUNK_SIZE
+            base_ty = cy * CHUNK_SIZE
+            lx0 = max(0, view.start_tx - base_tx)
+            lx1 = min(CHUNK_SIZE, view.end_tx - base_tx + 1)
+            ly0 = max(0, view.start_ty - base_ty)
+            ly1 = min(CHUNK_SIZE, view.end_ty - base_ty + 1)
+            
+            for ly in range(ly0, ly1):
+                for lx in range(lx0, lx1):
+                    t_type = chunk.tiles[(lx, ly)]
+                    scr_x, scr_y = camera.apply_pos((base_tx + lx) * TILE_SIZE, (base_ty + ly) * TILE_SIZE)
                     
-                    # Size
-                    scaled_size = int(TILE_SIZE * camera.zoom_level)
-                    # Optimization: Don't draw if tiny or offscreen (already Culled roughly by block loop)
-                    if -scaled_size < scr_x < camera.width and -scaled_size < scr_y < camera.height:
-                         asset = self.assets.get(t_type)
-                         if isinstance(asset, pygame.Surface):
-                             # Scale on fly? Expensive. But good for zoom. 
-                             s = pygame.transform.scale(asset, (scaled_size + 1, scaled_size + 1)) 
-                             screen.blit(s, (scr_x, scr_y))
-                         else:
-                             pygame.draw.rect(screen, asset, (scr_x, scr_y, scaled_size, scaled_size))
-                             
-                # Draw Vegetation (Simple, unsorted for now. Ideally should be sorted by Y with entities)
-                # We will handle vegetation later in main loop for Y-sort?
-                # Actually, Map.draw usually draws ground. 
-                # Let's add a method get_visible_vegetation(camera) to main for proper Y-sorting
+                    asset = self.assets.get(t_type)
+                    if isinstance(asset, pygame.Surface):
+                        screen.blit(self.get_scaled(t_type, scaled_size + 1, scaled_size + 1), (scr_x, scr_y))
+                    else:
+                        pygame.draw.rect(screen, asset, (scr_x, scr_y, scaled_size, scaled_size))
                 
-    def get_visible_vegetation(self, camera):
-        visible = []
-        # Same chunk logic
-        cx_scr, cy_scr = camera.width // 2, camera.height // 2
-        def screen_to_world(sx, sy):
-            wx = ((sx - cx_scr) / camera.zoom_level) + cx_scr - camera.camera.x
-            wy = ((sy - cy_scr) / camera.zoom_level) + cy_scr - camera.camera.y
-            return wx, wy
+    def query_vegetation(self, tx0, ty0, tx1, ty1, out):
+        # Vegetation in the inclusive tile rect, appended to out sorted by (y, x).
+        # Walks tile rows top to bottom and chunks left to right within each row.
+        for ty in range(ty0, ty1 + 1):
+            cy = ty // CHUNK_SIZE
+            for cx in range(tx0 // CHUNK_SIZE, tx1 // CHUNK_SIZE + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is not None:
+                    chunk.vegetation.query_row(ty, tx0, tx1, out)
+        return out
 
-        min_wx, min_wy = screen_to_world(0, 0)
-        max_wx, max_wy = screen_to_world(camera.width, camera.height)
-        
-        start_cx = int(min_wx // TILE_SIZE // CHUNK_SIZE) - 1
-        start_cy = int(min_wy // TILE_SIZE // CHUNK_SIZE) - 1
-        end_cx = int(max_wx // TILE_SIZE // CHUNK_SIZE) + 1
-        end_cy = int(max_wy // TILE_SIZE // CHUNK_SIZE) + 1
-        
-        for cy in range(start_cy, end_cy + 1):
-            for cx in range(start_cx, end_cx + 1):
-                chunk = self.get_chunk(cx, cy)
-                for veg in chunk.vegetation:
-                     visible.append(veg)
-        return visible
+    def get_visible_vegetation(self, camera, view=None):
+        # Vegetation whose sprite reaches into the view, y-sorted, in a reused buffer
+        # (valid until the next call). Anchors are widened left/down by the sprite extent.
+        view = view or View(camera)
+        ext_x, ext_y = self.veg_extent
+        out = self.visible_veg
+        out.clear()
+        return self.query_vegetation(view.start_tx - ext_x, view.start_ty, view.end_tx, view.end_ty + ext_y, out)
 
 class InputManager:
     def __init__(self):
@@ -273,7 +617,9 @@ class InputManager:
             "MOVE_DOWN": pygame.K_s,
             "MOVE_LEFT": pygame.K_a,
             "MOVE_RIGHT": pygame.K_d,
-            "PAUSE": pygame.K_ESCAPE
+            "PAUSE": pygame.K_ESCAPE,
+            "PROFILER": pygame.K_F3, # Frame profiler overlay
+            "PROFILER_DUMP": pygame.K_F4 # Write the profiler window to CSV
         }
         self.load()
 
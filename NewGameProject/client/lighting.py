@@ -0,0 +1,61 @@
+import math
+
+import pygame
+
+try:
+    import numpy
+    import pygame.surfarray
+except ImportError:
+    numpy = None # Gradients fall back to concentric circles (still built only once)
+
+LIGHT_MAP_SCALE = 4 # Light map is 1/4 of the screen on each axis, smoothed on upscale
+RADIUS_BUCKET = 4 # Light-map pixels; zooming reuses gradients within a bucket
+
+def radial_gradient(radius, color, intensity=0.5):
+    # Opaque RGB surface: color * intensity * (1 - d/radius)^2, black outside the
+    # radius, meant for BLEND_RGB_ADD onto a light map
+    size = radius * 2
+    surf = pygame.Surface((size, size))
+    if numpy is not None:
+        coords = numpy.arange(size, dtype=numpy.float32) - radius + 0.5
+        dist = numpy.sqrt(coords[:, None] ** 2 + coords[None, :] ** 2) / radius
+        falloff = numpy.clip(1.0 - dist, 0.0, 1.0) ** 2 * intensity
+        pixels = numpy.empty((size, size, 3), dtype=numpy.uint8)
+        for c in range(3):
+            pixels[:, :, c] = (falloff * color[c]).astype(numpy.uint8)
+        pygame.surfarray.blit_array(surf, pixels)
+    else:
+        for i in range(radius, 0, -1):
+            f = (1 - i / radius) ** 2 * intensity
+            pygame.draw.circle(surf, [int(c * f) for c in color], (radius, radius), i)
+    return surf
+
+class LightMap:
+    # Low-resolution light buffer for the night pass. begin() fills it with the
+    # ambient light, add() accumulates lights additively, apply() upscales it and
+    # multiplies it onto the frame. Gradients are cached per (radius, color).
+    def __init__(self, screen_width, screen_height, scale=LIGHT_MAP_SCALE):
+        self.scale = scale
+        self.surface = pygame.Surface((math.ceil(screen_width / scale), math.ceil(screen_height / scale)))
+        self.scaled = pygame.Surface((screen_width, screen_height))
+        self.gradients = {} # (radius, color, intensity) -> Surface
+
+    def gradient(self, radius, color, intensity=0.5):
+        key = (radius, color, intensity)
+        surf = self.gradients.get(key)
+        if surf is None:
+            surf = self.gradients[key] = radial_gradient(radius, color, intensity)
+        return surf
+
+    def begin(self, ambient):
+        self.surface.fill(ambient)
+
+    def add(self, x, y, radius, color, intensity=0.5):
+        # x, y, radius in screen pixels
+        r = max(1, round(radius / self.scale / RADIUS_BUCKET)) * RADIUS_BUCKET
+        surf = self.gradient(r, color, intensity)
+        self.surface.blit(surf, (int(x / self.scale) - r, int(y / self.scale) - r), special_flags=pygame.BLEND_RGB_ADD)
+
+    def apply(self, screen):
+        pygame.transform.smoothscale(self.surface, self.scaled.get_size(), self.scaled)
+        screen.blit(self.scaled, (0, 0), special_flags=pygame.BLEND_RGB_MULT)
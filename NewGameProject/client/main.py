@@ -1,49 +1,64 @@
 import pygame
 import sys
+import os
 import socket
 import threading
 import json
 import logging
-import traceback
 import queue
-from ui import Button, TextInput
-from game_engine import Camera, Map, InputManager, TILE_SIZE, DayNightCycle, Firefly
-import random
-import time
-import math
-import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common')) # Shared with the server (logsetup.py)
+from ui import Button, TextInput, Label, UIScreen
+from game_engine import Camera, Map, View, InputManager, TILE_SIZE, VEG_TYPES, MAP_ASSETS, CHAR_SHEETS, CHAR_FRAME, DayNightCycle
+from assets import AssetLoader
+from atlas import load_index, atlas_sources, prepare_source, ATLAS_IMAGE
+from pixelcache import PixelCache
+from timing import FrameScheduler, FixedTimestep, ACTIVE, IDLE, STATIC, wake
+from render import RenderQueue, SurfaceCache, TextLabel, render_text, DRAW_PLAYER
+from lighting import LightMap
+import particles
+from profiler import FrameProfiler, ProfilerOverlay
+from logsetup import setup_logging, kv
 
 # ... imports assumed correct at top
 
-# Setup logging
-logging.basicConfig(
-    filename='client_debug.log',
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
-# Also log to stdout
-console = logging.StreamHandler()
-console.setLevel(logging.DEBUG)
-logging.getLogger('').addHandler(console)
+# Setup logging: client_debug.log plus stdout, written from a background thread
+setup_logging('client_debug.log', level=logging.DEBUG)
+log = logging.getLogger('client')
+net_log = logging.getLogger('client.net')
 
-logging.info("Starting game client...")
+log.info("Starting game client...")
 
 # --- Constants ---
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
-FPS = 60
+FPS = 60 # Gameplay frame cap (0 = uncapped)
+IDLE_FPS = 10 # Gameplay while unfocused/minimized
+SIM_HZ = 60 # Fixed simulation rate, independent of FPS
 BG_COLOR = (30, 30, 30)
 PLAYER_COLOR = (100, 200, 100)
+PARTICLES = 2000 # Ambient particle pool; the system sheds some if they blow their frame budget
+ZOOM_BUCKET = 0.05 # Character sprites are baked per zoom step of this size
 SERVER_IP = '127.0.0.1'
 SERVER_PORT = 5555
 
+# Streamed by the AssetLoader: name -> (path, has_alpha)
+UI_ASSETS = {
+    'bg': ("assets/bg.png", False),
+    'panel': ("assets/panel.png", True),
+    'button': ("assets/button.png", True),
+    'compass': ("assets/ui/compass.png", True),
+}
+
 class GameClient:
     def __init__(self):
         # State Machine: BOOT -> LOADING -> LOGIN -> GAME
         self.state = "BOOT"
         self.loading_step = 0
-        self.total_loading_steps = 6
+        self.asset_loader = None
+        self.atlas = None # atlas.Atlas when a baked texture atlas is used
+        self.map_assets_loaded = False
+        self.sprites_loaded = False
+        self.assets_done = False # Everything loaded, including post-processing
         self.loading_msg = "Initializing..."
         self.loading_progress = 0.0
         
@@ -51,7 +66,9 @@ class GameClient:
         pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Soul of Wind")
-        self.clock = pygame.time.Clock()
+        self.scheduler = FrameScheduler(FPS, IDLE_FPS)
+        self.clock = self.scheduler.clock
+        self.delta_time = self.scheduler.dt
         self.running = True
         
         # Assets containers (Loaded in LOADING state)
@@ -62,19 +79,28 @@ class GameClient:
         self.panel_img = None
         self.btn_img = None
         self.compass_img = None
-        self.light_surf = None
-        self.firefly_surf = None
         self.char_assets = {}
+        self.sprite_cache = SurfaceCache(128) # Baked characters: (layers, zoom bucket, frame) -> Surface
         
         # Engine Systems (Initialized but not loaded)
         self.camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
         self.map_system = Map(SCREEN_WIDTH, SCREEN_HEIGHT) # Assets loaded later
         self.day_night = DayNightCycle(SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.light_map = LightMap(SCREEN_WIDTH, SCREEN_HEIGHT) # Night lighting pass
+        # Fireflies, leaves and wind streaks (needs numpy; skipped without it)
+        self.particles = particles.ParticleSystem(PARTICLES) if particles.AVAILABLE else None
         self.input_manager = InputManager()
+        self.render_queue = RenderQueue()
+        self.profiler = FrameProfiler() # Per-stage frame timings (overlay, --profile, bench_render.py)
+        self.profiler_overlay = None # Created on first toggle
+        self.show_profiler = False
         
         # Game Data
         self.player_pos = [400, 300]
-        self.player_speed = 5
+        self.player_speed = 300 # px/s
+        self.player_velocity = (0, 0) # px/s, used for chunk prefetch
+        self.prev_player_pos = list(self.player_pos) # State before the last sim step (for interpolation)
+        self.sim_clock = FixedTimestep(SIM_HZ)
         self.other_players = {}
         self.username = ""
         self.connected = False
@@ -88,6 +114,8 @@ class GameClient:
         self.show_controls = False
         self.waiting_for_key = None
         self.control_buttons = []
+        self.active_ui = None # UIScreen presented last frame (None after a full-frame draw)
+        self.game_snapshot = None # Last game frame, backdrop for the pause/controls menus
         
         # Switch to LOADING
         self.state = "LOADING"
@@ -99,6 +127,8 @@ class GameClient:
                 self.title_font = pygame.font.Font(None, 74)
                 self.font = pygame.font.Font(None, 32)
                 self.msg_font = pygame.font.Font(None, 24)
+                # Changing text gets a dirty-only label instead of filling the text cache
+                self.loading_label = TextLabel(self.font, (255, 255, 255))
                 
                 # Load UI Images
                 self.loading_bg = None
@@ -106,49 +136,83 @@ class GameClient:
                     self.loading_bg = pygame.image.load("assets/loading_bg.png").convert()
                     self.loading_bg = pygame.transform.scale(self.loading_bg, (SCREEN_WIDTH, SCREEN_HEIGHT))
 
-                if os.path.exists("assets/bg.png"): self.bg_img = pygame.image.load("assets/bg.png").convert()
-                if os.path.exists("assets/panel.png"): self.panel_img = pygame.image.load("assets/panel.png").convert_alpha()
-                if os.path.exists("assets/button.png"): self.btn_img = pygame.image.load("assets/button.png").convert_alpha()
-                try:
-                     self.compass_img = pygame.image.load("assets/ui/compass.png").convert_alpha() if os.path.exists("assets/ui/compass.png") else None
-                except: pass
-                
-                # Init UI Interactables (Buttons)
-                self.init_login_ui()
-                self.init_game_ui()
+                # Everything else decodes on worker threads
+                self.asset_loader = AssetLoader(on_decoded=wake, cache=PixelCache())
+                for name, (path, alpha) in UI_ASSETS.items():
+                    self.asset_loader.add('ui/' + name, path, alpha)
+                # A baked atlas (bake_assets.bat) replaces the map and character
+                # sheets with one pre-scaled image; stale or missing -> source PNGs
+                self.atlas = load_index()
+                # Both are kept decoded and pre-scaled in the pixel cache across runs
+                if self.atlas:
+                    self.asset_loader.add('atlas', ATLAS_IMAGE, True, cache=True)
+                else:
+                    for name, (path, crop, size) in atlas_sources().items():
+                        alpha = MAP_ASSETS[name[4:]][1] if name.startswith('map/') else True
+                        prepare = lambda surf, crop=crop, size=size: prepare_source(surf, crop, size)
+                        self.asset_loader.add(name, path, alpha, prepare=prepare, cache=True,
+                                              cache_key=(crop, tuple(size), TILE_SIZE))
+                self.asset_loader.start()
+                self.loading_step = 1
                 
             elif self.loading_step == 1:
-                self.loading_msg = "Generating Map Assets..."
-                self.map_system.load_assets()
+                # Show the login screen as soon as its own assets are in; the world
+                # and character assets keep streaming in while the player types
+                self.poll_assets()
+                loader = self.asset_loader
+                mb = 1024 * 1024
+                self.loading_msg = f"Loading assets... {loader.loaded_bytes / mb:.1f}/{loader.total_bytes / mb:.1f} MB"
+                self.loading_progress = loader.progress()
+                if loader.ready(['ui/' + name for name in UI_ASSETS]):
+                    self.bg_img = loader.get('ui/bg')
+                    self.panel_img = loader.get('ui/panel')
+                    self.btn_img = loader.get('ui/button')
+                    self.compass_img = loader.get('ui/compass')
                 
-            elif self.loading_step == 2:
-                self.loading_msg = "Loading Characters..."
-                self.load_sprites()
-                
-            elif self.loading_step == 3:
-                self.loading_msg = "Pre-rendering Lighting Effects..."
-                self.light_surf = self.create_light_surf(128, (255, 255, 200))
-                self.firefly_surf = self.create_light_surf(16, (150, 255, 100))
-                # self.bloom_surf = pygame.Surface((SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
-                self.fireflies = [Firefly(random.randint(0, 1000), random.randint(0, 1000)) for _ in range(50)]
-
-            elif self.loading_step == 4:
-                self.loading_msg = "Connecting to Server..."
-                # We don't connect yet, just setup
-                
-            elif self.loading_step == 5:
-                self.loading_msg = "Done!"
-                time.sleep(0.5) # Fake delay for chillness
-                self.state = "LOGIN"
-                
-            self.loading_step += 1
-            self.loading_progress = min(1.0, self.loading_step / self.total_loading_steps)
+                    # Init UI Interactables (Buttons)
+                    self.init_login_ui()
+                    self.init_game_ui()
+                    self.loading_step = 2
+                    self.state = "LOGIN"
             
         except Exception as e:
-            logging.error(f"Loading Error at step {self.loading_step}: {e}")
-            traceback.print_exc()
+            log.error("Loading failed", extra=kv(step=self.loading_step, error=e), exc_info=True)
             self.state = "LOGIN"
 
+    def poll_assets(self):
+        # Called every frame until all assets are in. Character creation and the game
+        # can't run without their assets, so those states wait for the rest.
+        loader = self.asset_loader
+        if self.state in ("GAME", "CREATE_CHARACTER"):
+            loader.wait()
+        else:
+            loader.poll()
+        
+        if self.atlas and not self.map_assets_loaded and loader.ready(['atlas']):
+            self.atlas.image = loader.get('atlas')
+            if self.atlas.image is not None:
+                self.map_system.load_assets(mips=self.atlas.mips('map/'))
+                self.load_sprites(self.atlas.group('char/'))
+            else:
+                # Atlas failed to decode: load the sources directly
+                self.map_system.load_assets()
+                self.load_sprites()
+            self.map_assets_loaded = self.sprites_loaded = True
+
+        if not self.map_assets_loaded and loader.ready(['map/' + name for name in MAP_ASSETS]):
+            self.map_system.load_assets({name: loader.get('map/' + name) for name in MAP_ASSETS})
+            self.map_assets_loaded = True
+            
+        if not self.sprites_loaded and loader.ready(['char/' + name for name in CHAR_SHEETS]):
+            self.load_sprites({name: loader.get('char/' + name) for name in CHAR_SHEETS})
+            self.sprites_loaded = True
+        
+        if self.map_assets_loaded and self.sprites_loaded:
+            # Light gradients are built lazily by the LightMap (once per size/colour)
+            # Spawn area is generated up front; everything else streams in
+            self.map_system.generate_around(self.player_pos)
+            self.assets_done = True
+
     def draw_loading(self):
         self.screen.fill((20, 20, 40))
         if hasattr(self, 'loading_bg') and self.loading_bg:
@@ -170,9 +234,10 @@ class GameClient:
         
         # Text
         if self.font:
-            txt = self.font.render(self.loading_msg, True, (255, 255, 255))
+            txt = self.loading_label.render(self.loading_msg)
             self.screen.blit(txt, (SCREEN_WIDTH//2 - txt.get_width()//2, y - 40))
             
+        self.active_ui = None
         pygame.display.flip()
 
     def init_login_ui(self):
@@ -188,6 +253,18 @@ class GameClient:
         self.btn_register = Button(300, 320, 200, 50, "Create Account", self.font, image=self.btn_img)
         self.btn_back = Button(300, 380, 200, 40, "Back to Login", self.font, bg_color=(150, 150, 150), image=self.btn_img)
         
+        size = (SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.login_ui = UIScreen(size, lambda surf: self.draw_menu_background(surf, "Login", (200, 255, 200), (50, 50, 70)), [
+            self.login_user_input, self.login_pass_input, self.btn_login, self.btn_goto_register,
+            Label(SCREEN_WIDTH//2, 450, self.msg_font, lambda: self.status_msg, (255, 100, 100), centered=True),
+        ])
+        self.register_ui = UIScreen(size, lambda surf: self.draw_menu_background(surf, "Register", (255, 200, 200), (70, 50, 50)), [
+            self.reg_user_input, self.reg_pass_input, self.btn_register, self.btn_back,
+            Label(SCREEN_WIDTH//2, 450, self.msg_font, lambda: self.status_msg, (255, 255, 100), centered=True),
+        ])
+        # Dims whatever is on screen when it becomes active
+        self.connecting_ui = UIScreen(size, self.draw_connecting_background)
+        
         # Character Creation UI
         self.btn_create_char = Button(300, 520, 200, 50, "Start Adventure", self.font, image=self.btn_img)
         self.temp_appearance = {"body": 0, "hair": 0, "shirt": 0, "pants": 0, "eyes": 0}
@@ -199,74 +276,142 @@ class GameClient:
         self.btn_customize = Button(SCREEN_WIDTH//2 - 100, 270, 200, 50, "Customize", self.font, image=self.btn_img)
         self.btn_controls = Button(SCREEN_WIDTH//2 - 100, 340, 200, 50, "Controls", self.font, image=self.btn_img)
         self.btn_quit = Button(SCREEN_WIDTH//2 - 100, 480, 200, 50, "Quit", self.font, image=self.btn_img)
+        self.pause_ui = UIScreen((SCREEN_WIDTH, SCREEN_HEIGHT), self.draw_pause_background,
+                                 [self.btn_resume, self.btn_customize, self.btn_controls, self.btn_quit])
+        
+        # Controls UI: one clickable key label per binding
+        self.btn_controls_back = Button(50, 50, 100, 40, "Back", self.font, image=self.btn_img)
+        self.control_labels = {}
+        y = 150
+        for action in self.input_manager.bindings:
+            self.control_labels[action] = Label(400, y, self.font,
+                                                lambda a=action: self.get_binding_label(a),
+                                                get_color=lambda a=action: (255, 255, 0) if self.waiting_for_key == a else (255, 255, 255))
+            y += 40
+        self.controls_ui = UIScreen((SCREEN_WIDTH, SCREEN_HEIGHT), self.draw_controls_background,
+                                    [self.btn_controls_back] + list(self.control_labels.values()))
+
+    def present_ui(self, ui_screen):
+        # Full redraw when switching screens (or after a full-frame state drew over it)
+        if ui_screen is not self.active_ui:
+            ui_screen.invalidate()
+            self.active_ui = ui_screen
+        ui_screen.present(self.screen)
+
+    def draw_menu_background(self, surf, title, title_color, fill_color):
+        if self.bg_img:
+            surf.blit(self.bg_img, (0, 0))
+        else:
+            surf.fill(fill_color)
+        
+        if self.panel_img:
+             # Center panel
+             surf.blit(self.panel_img, (SCREEN_WIDTH//2 - 200, SCREEN_HEIGHT//2 - 175))
         
-    def load_sprites(self):
+        title_surf = render_text(self.title_font, title, True, title_color)
+        surf.blit(title_surf, (SCREEN_WIDTH//2 - title_surf.get_width()//2, 100))
+
+    def draw_connecting_background(self, surf):
+        # Overlay to prevent interaction
+        surf.blit(self.screen, (0, 0))
+        s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        s.fill((0, 0, 0, 100))
+        surf.blit(s, (0,0))
+        spinner_text = render_text(self.font, "Connecting...", True, (255, 255, 255))
+        surf.blit(spinner_text, (SCREEN_WIDTH//2 - spinner_text.get_width()//2, SCREEN_HEIGHT//2))
+
+    def draw_game_backdrop(self, surf, alpha):
+        if self.game_snapshot:
+            surf.blit(self.game_snapshot, (0, 0))
+        else:
+            surf.fill(BG_COLOR)
+        s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        s.fill((0, 0, 0, alpha))
+        surf.blit(s, (0,0))
+
+    def draw_pause_background(self, surf):
+        self.draw_game_backdrop(surf, 150)
+        title = render_text(self.title_font, "Paused", True, (255, 255, 255))
+        surf.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 100))
+
+    def draw_controls_background(self, surf):
+        self.draw_game_backdrop(surf, 200)
+        title = render_text(self.title_font, "Controls", True, (255, 255, 255))
+        surf.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 50))
+        for action, label in self.control_labels.items():
+            txt_surf = render_text(self.font, f"{action}:", True, (200, 200, 200))
+            surf.blit(txt_surf, (200, label.y))
+
+    def get_binding_label(self, action):
+        if self.waiting_for_key == action:
+            return "Apply Key..."
+        return pygame.key.name(self.input_manager.bindings[action])
+        
+    def load_sprites(self, sheets=None):
+        # sheets: optional name -> converted Surface (e.g. from the AssetLoader)
         try:
             self.char_assets = {}
             # Helper to safely load
-            def load_safe(path):
+            def load_safe(name):
+                if sheets is not None:
+                    return sheets.get(name)
+                path = CHAR_SHEETS[name]
                 if os.path.exists(path):
                     return pygame.image.load(path).convert_alpha()
                 return None
 
-            body_sheet = load_safe("assets/character/body.png")
-            hair_sheet = load_safe("assets/character/hair.png")
-            armor_sheet = load_safe("assets/character/armor.png")
+            body_sheet = load_safe('body')
+            hair_sheet = load_safe('hair')
+            armor_sheet = load_safe('armor')
             
             def get_frame(sheet):
                 if not sheet: return None
                 # If sheet is big enough, slice it. Else use whole.
-                if sheet.get_width() >= 64 and sheet.get_height() >= 128:
-                    return sheet.subsurface((0, 0, 64, 128))
+                if sheet.get_width() >= CHAR_FRAME[2] and sheet.get_height() >= CHAR_FRAME[3]:
+                    return sheet.subsurface(CHAR_FRAME)
                 return sheet
 
             self.char_assets['body'] = get_frame(body_sheet)
             self.char_assets['hair'] = get_frame(hair_sheet)
             self.char_assets['armor'] = get_frame(armor_sheet)
+            self.sprite_cache.clear()
             
         except Exception as e:
-            logging.error(f"Failed to load char assets: {e}")
+            log.error("Failed to load char assets", extra=kv(error=e))
             self.char_assets = {}
 
-    def create_light_surf(self, radius, color):
-        # Create a radial gradient surface for lighting
-        surf = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
-        # Draw multiple concentric circles for gradient look
-        for i in range(radius, 0, -2):
-            alpha = int(255 * (1 - (i / radius))**2) # Quadratic falloff
-            # Create a color with this alpha
-            # Note: Putting alpha in the color tuple works for draw.circle with SRCALPHA surf
-            c = (color[0], color[1], color[2], max(0, min(255, alpha * 0.5))) 
-            pygame.draw.circle(surf, c, (radius, radius), i)
-        return surf
-
-    def draw_character(self, surface, x, y, appearance, zoom=1.0):
+    def draw_character(self, surface, x, y, appearance, zoom=1.0, frame=0):
         # appearance: {body: 0, hair: 0...} - Currently we only have 1 set of realistic assets
         # In a full system, 'hair': 0 would map to hair_0.png, 'hair': 1 to hair_1.png
         
-        base_w, base_h = 64, 128
-        dest_w = int(base_w * zoom)
-        dest_h = int(base_h * zoom)
-        
         if not self.char_assets or not self.char_assets.get('body'):
              # Fallback BLUE for missing assets
              pygame.draw.rect(surface, (0, 0, 255), (x, y, 32 * zoom, 64 * zoom))
              return
 
-        # Body
-        if 'body' in self.char_assets:
-            s = pygame.transform.scale(self.char_assets['body'], (dest_w, dest_h))
-            surface.blit(s, (x, y))
-            
-        # Shirt/Armor (If equipped in appearance)
-        if appearance.get('shirt', 1) == 1 and 'armor' in self.char_assets:
-            s = pygame.transform.scale(self.char_assets['armor'], (dest_w, dest_h))
-            surface.blit(s, (x, y))
-
-        # Hair
-        if appearance.get('hair', 1) == 1 and 'hair' in self.char_assets:
-            s = pygame.transform.scale(self.char_assets['hair'], (dest_w, dest_h))
-            surface.blit(s, (x, y))
+        # One blit of a pre-composited sprite, keyed by the appearance fields that pick layers
+        bucket = max(1, round(zoom / ZOOM_BUCKET))
+        shirt = appearance.get('shirt', 1) == 1
+        hair = appearance.get('hair', 1) == 1
+        key = (shirt, hair, bucket, frame)
+        sprite = self.sprite_cache.get(key, lambda: self.bake_character(shirt, hair, bucket * ZOOM_BUCKET, frame))
+        surface.blit(sprite, (x, y))
+
+    def bake_character(self, shirt, hair, zoom, frame=0):
+        # Composite body/armor/hair into one surface at the given zoom.
+        # frame is reserved for animation; the sheets have a single frame for now.
+        base_w, base_h = 64, 128
+        dest_w = int(base_w * zoom)
+        dest_h = int(base_h * zoom)
+        sprite = pygame.Surface((dest_w, dest_h), pygame.SRCALPHA)
+        
+        layers = ['body']
+        if shirt: layers.append('armor') # Shirt/Armor (If equipped in appearance)
+        if hair: layers.append('hair')
+        for layer in layers:
+            if self.char_assets.get(layer):
+                sprite.blit(pygame.transform.scale(self.char_assets[layer], (dest_w, dest_h)), (0, 0))
+        return sprite
 
     def connect_and_login(self, username, password, is_register=False):
         if self.connecting: return
@@ -297,11 +442,12 @@ class GameClient:
                     self.status_msg = "Logging in..."
                     
             except Exception as e:
-                logging.error(f"Connection failed: {e}")
+                net_log.error("Connection failed", extra=kv(error=e))
                 self.status_msg = "Connection Failed!"
                 self.connected = False
             finally:
                 self.connecting = False
+                wake()
 
         threading.Thread(target=task).start()
 
@@ -312,6 +458,7 @@ class GameClient:
                 if not data:
                     self.network_queue.put({"type": "DISCONNECT"})
                     self.connected = False
+                    wake()
                     break
                 try:
                     # Basic JSON split to handle concatenated packets
@@ -325,13 +472,15 @@ class GameClient:
                             try:
                                 msg = json.loads(part)
                                 self.network_queue.put(msg)
-                            except:
-                                pass
-                except Exception:
-                    pass
+                            except json.JSONDecodeError:
+                                net_log.warning("Dropped malformed packet", extra=kv(size=len(part)))
+                except Exception as e:
+                    net_log.warning("Packet handling failed", extra=kv(error=e))
+                wake()
             except Exception as e:
-                logging.error(f"Error receiving data: {e}")
+                net_log.error("Receive failed", extra=kv(error=e))
                 self.connected = False
+                wake()
                 break
 
     def process_network_messages(self):
@@ -352,6 +501,7 @@ class GameClient:
                     if msg.get('has_character'):
                         self.state = "GAME"
                         self.my_appearance = msg.get('appearance')
+                        self.sim_clock.reset()
                         pygame.display.set_caption(f"Soul of Wind - Playing as {self.username}")
                     else:
                         self.state = "CREATE_CHARACTER"
@@ -370,6 +520,7 @@ class GameClient:
                 elif msg_type == 'CREATE_CHAR_SUCCESS':
                     self.state = "GAME"
                     self.my_appearance = msg.get('appearance')
+                    self.sim_clock.reset()
                     pygame.display.set_caption(f"Soul of Wind - Playing as {self.username}")
                     
             except queue.Empty:
@@ -385,35 +536,8 @@ class GameClient:
             self.connected = False
 
     def handle_login_screen(self):
-        if self.bg_img:
-            self.screen.blit(self.bg_img, (0, 0))
-        else:
-            self.screen.fill((50, 50, 70))
-        
-        if self.panel_img:
-             # Center panel
-             self.screen.blit(self.panel_img, (SCREEN_WIDTH//2 - 200, SCREEN_HEIGHT//2 - 175))
-        
-        title_surf = self.title_font.render("Login", True, (200, 255, 200))
-        self.screen.blit(title_surf, (SCREEN_WIDTH//2 - title_surf.get_width()//2, 100))
-        
-        self.login_user_input.draw(self.screen)
-        self.login_pass_input.draw(self.screen)
-        self.btn_login.draw(self.screen)
-        self.btn_goto_register.draw(self.screen)
-        
-        if self.status_msg:
-            msg_surf = self.msg_font.render(self.status_msg, True, (255, 100, 100))
-            self.screen.blit(msg_surf, (SCREEN_WIDTH//2 - msg_surf.get_width()//2, 450))
-
         if self.connecting:
-            # Overlay to prevent interaction
-            s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            s.fill((0, 0, 0, 100))
-            self.screen.blit(s, (0,0))
-            spinner_text = self.font.render("Connecting...", True, (255, 255, 255))
-            self.screen.blit(spinner_text, (SCREEN_WIDTH//2 - spinner_text.get_width()//2, SCREEN_HEIGHT//2))
-            pygame.display.flip()
+            self.present_ui(self.connecting_ui)
             
             # Allow quitting during connection attempt
             for event in pygame.event.get():
@@ -442,37 +566,11 @@ class GameClient:
             self.btn_login.check_hover(pygame.mouse.get_pos())
             self.btn_goto_register.check_hover(pygame.mouse.get_pos())
             
-        pygame.display.flip()
+        self.present_ui(self.login_ui)
 
     def handle_register_screen(self):
-        if self.bg_img:
-            self.screen.blit(self.bg_img, (0, 0))
-        else:
-            self.screen.fill((70, 50, 50))
-
-        if self.panel_img:
-             # Center panel
-             self.screen.blit(self.panel_img, (SCREEN_WIDTH//2 - 200, SCREEN_HEIGHT//2 - 175))
-        
-        title_surf = self.title_font.render("Register", True, (255, 200, 200))
-        self.screen.blit(title_surf, (SCREEN_WIDTH//2 - title_surf.get_width()//2, 100))
-        
-        self.reg_user_input.draw(self.screen)
-        self.reg_pass_input.draw(self.screen)
-        self.btn_register.draw(self.screen)
-        self.btn_back.draw(self.screen)
-        
-        if self.status_msg:
-            msg_surf = self.msg_font.render(self.status_msg, True, (255, 255, 100))
-            self.screen.blit(msg_surf, (SCREEN_WIDTH//2 - msg_surf.get_width()//2, 450))
-
         if self.connecting:
-            s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            s.fill((0, 0, 0, 100))
-            self.screen.blit(s, (0,0))
-            spinner_text = self.font.render("Connecting...", True, (255, 255, 255))
-            self.screen.blit(spinner_text, (SCREEN_WIDTH//2 - spinner_text.get_width()//2, SCREEN_HEIGHT//2))
-            pygame.display.flip()
+            self.present_ui(self.connecting_ui)
            # Event handling
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -482,8 +580,6 @@ class GameClient:
                         self.camera.set_zoom(self.camera.target_zoom + 0.1)
                     elif event.button == 5: # Scroll Down
                         self.camera.set_zoom(self.camera.target_zoom - 0.1)
-
-            pygame.display.flip()
             return
 
         for event in pygame.event.get():
@@ -507,7 +603,7 @@ class GameClient:
             self.btn_register.check_hover(pygame.mouse.get_pos())
             self.btn_back.check_hover(pygame.mouse.get_pos())
             
-        pygame.display.flip()
+        self.present_ui(self.register_ui)
 
     # Legacy sprites methods removed. Using new layered system defined above.
 
@@ -523,7 +619,7 @@ class GameClient:
         self.screen.blit(s, (100, 50))
         
         # Title
-        title = self.title_font.render("Create Character", True, (255, 255, 255))
+        title = render_text(self.title_font, "Create Character", True, (255, 255, 255))
         self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 50))
         
         # Preview
@@ -539,7 +635,7 @@ class GameClient:
         
         for idx, cat in enumerate(categories):
             # Label
-            lbl = self.font.render(cat.capitalize(), True, (200, 200, 200))
+            lbl = render_text(self.font, cat.capitalize(), True, (200, 200, 200))
             self.screen.blit(lbl, (200, y_start + idx * 40))
             
             # Left Button (<)
@@ -548,7 +644,7 @@ class GameClient:
             
             # Val
             val = self.temp_appearance[cat]
-            val_surf = self.font.render(str(val + 1), True, (255, 255, 255))
+            val_surf = render_text(self.font, str(val + 1), True, (255, 255, 255))
             self.screen.blit(val_surf, (400, y_start + idx * 40))
             
             # Right Button (>)
@@ -586,46 +682,10 @@ class GameClient:
                 
             self.btn_create_char.check_hover(m_pos)
             
+        self.active_ui = None
         pygame.display.flip()
 
     def handle_controls_screen(self):
-        # Overlay
-        s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        s.fill((0, 0, 0, 200))
-        self.screen.blit(s, (0,0))
-        
-        title = self.title_font.render("Controls", True, (255, 255, 255))
-        self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 50))
-        
-        y = 150
-        for action, key_code in self.input_manager.bindings.items():
-            txt_surf = self.font.render(f"{action}:", True, (200, 200, 200))
-            self.screen.blit(txt_surf, (200, y))
-            
-            key_name = pygame.key.name(key_code)
-            if self.waiting_for_key == action:
-                key_name = "Apply Key..."
-                color = (255, 255, 0)
-            else:
-                color = (255, 255, 255)
-            
-            # Simple clickable text area for now
-            val_surf = self.font.render(key_name, True, color)
-            val_rect = val_surf.get_rect(topleft=(400, y))
-            self.screen.blit(val_surf, val_rect)
-            
-            # Check click
-            if pygame.mouse.get_pressed()[0]:
-                m_pos = pygame.mouse.get_pos()
-                if val_rect.collidepoint(m_pos):
-                     self.waiting_for_key = action
-            
-            y += 40
-
-        # Back Button
-        back_btn = Button(50, 50, 100, 40, "Back", self.font, image=self.btn_img)
-        back_btn.draw(self.screen)
-        
         for event in pygame.event.get():
             if event.type == pygame.QUIT: self.running = False
             
@@ -636,32 +696,30 @@ class GameClient:
                         self.input_manager.save()
                     self.waiting_for_key = None
             else:
-                if back_btn.is_clicked(event):
+                if self.btn_controls_back.is_clicked(event):
                     self.show_controls = False
                 elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                     self.show_controls = False
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                    # Click a key name to rebind it
+                    for action, label in self.control_labels.items():
+                        if label.rect.collidepoint(event.pos):
+                            self.waiting_for_key = action
+            
+            self.btn_controls_back.check_hover(pygame.mouse.get_pos())
 
-        pygame.display.flip()
+        self.present_ui(self.controls_ui)
+
+    def resume_game(self):
+        self.paused = False
+        self.sim_clock.reset()
 
     def handle_pause_menu(self):
-        # Draw transparent overlay
-        s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        s.fill((0, 0, 0, 150))
-        self.screen.blit(s, (0,0))
-        
-        title = self.title_font.render("Paused", True, (255, 255, 255))
-        self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 100))
-        
-        self.btn_resume.draw(self.screen)
-        self.btn_customize.draw(self.screen)
-        self.btn_controls.draw(self.screen)
-        self.btn_quit.draw(self.screen)
-        
         for event in pygame.event.get():
             if event.type == pygame.QUIT: self.running = False
             
             if self.btn_resume.is_clicked(event):
-                self.paused = False
+                self.resume_game()
             
             if self.btn_customize.is_clicked(event):
                 # Reuse the CREATE_CHARACTER logic but inside game
@@ -676,32 +734,72 @@ class GameClient:
                 self.running = False
                 
             if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-                self.paused = False
+                self.resume_game()
                 
             self.btn_resume.check_hover(pygame.mouse.get_pos())
             self.btn_customize.check_hover(pygame.mouse.get_pos())
             self.btn_controls.check_hover(pygame.mouse.get_pos())
             self.btn_quit.check_hover(pygame.mouse.get_pos())
         
-        pygame.display.flip()
-
-    def handle_game(self):
-        # Input using InputManager
-        moved = False
+        if self.paused and not self.show_controls and self.state == "GAME":
+            self.present_ui(self.pause_ui)
+
+    def draw_queued_entity(self, slot):
+        rq = self.render_queue
+        sx, sy = self.camera.apply_pos(rq.x[slot], rq.y[slot])
+        # Culling (vegetation was culled per tile by the view)
+        if -128 < sx < SCREEN_WIDTH and -128 < sy < SCREEN_HEIGHT:
+            if rq.kind[slot] == DRAW_PLAYER:
+                self.draw_character(self.screen, sx, sy, rq.a[slot], self.camera.zoom_level)
+                # Name
+                name_surf = render_text(self.msg_font, rq.b[slot], True, (255, 255, 255))
+                self.screen.blit(name_surf, (sx, sy - 20))
+
+    def draw_queued_vegetation(self, i):
+        veg = self.map_system.visible_veg
+        asset = self.map_system.assets.get(VEG_TYPES[veg.type_id[i]])
+        if isinstance(asset, pygame.Surface):
+            zoom = self.camera.zoom_level
+            sx, sy = self.camera.apply_pos(veg.x[i] * TILE_SIZE, veg.y[i] * TILE_SIZE)
+            # Simple draw without sway for now to test stability
+            w = int(asset.get_width() * zoom)
+            h = int(asset.get_height() * zoom)
+            scaled = self.map_system.get_scaled(VEG_TYPES[veg.type_id[i]], w, h)
+            self.screen.blit(scaled, (sx, sy - h + 32*zoom))
+
+    def draw_lighting(self, render_pos):
+        # Night pass: ambient darkness plus additive lights, multiplied onto the frame.
+        # Nothing to do in full daylight.
+        if self.day_night.get_alpha() == 0:
+            return
+        zoom = self.camera.zoom_level
+        light_map = self.light_map
+        light_map.begin(self.day_night.get_ambient())
+        
+        # Every player carries a lantern (centred on the 64x128 sprite)
+        positions = [render_pos]
+        positions.extend((p['pos']['x'], p['pos']['y']) for p in self.other_players.values() if p.get('pos'))
+        radius = 128 * zoom
+        for x, y in positions:
+            sx, sy = self.camera.apply_pos(x, y)
+            sx += 32 * zoom
+            sy += 64 * zoom
+            if -radius < sx < SCREEN_WIDTH + radius and -radius < sy < SCREEN_HEIGHT + radius:
+                light_map.add(sx, sy, radius, (255, 255, 200), 1.0)
+        
+        light_map.apply(self.screen)
+
+    def simulate(self, step):
+        # One fixed simulation step of `step` seconds. Returns True if the player moved.
+        self.prev_player_pos[:] = self.player_pos
         
-        # Check Pause
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT: self.running = False
-            if event.type == pygame.KEYDOWN:
-                if event.key == self.input_manager.bindings['PAUSE']:
-                    self.paused = True
-                    return
-
         # Check Modifiers
         keys = pygame.key.get_pressed()
         is_sneaking = keys[pygame.K_LSHIFT] or keys[pygame.K_RSHIFT]
-        current_speed = self.player_speed * 0.5 if is_sneaking else self.player_speed
-
+        current_speed = (self.player_speed * 0.5 if is_sneaking else self.player_speed) * step
+        
+        # Input using InputManager
+        moved = False
         if self.input_manager.is_pressed('MOVE_UP'): 
             self.player_pos[1] -= current_speed
             moved = True
@@ -714,85 +812,107 @@ class GameClient:
         if self.input_manager.is_pressed('MOVE_RIGHT'): 
             self.player_pos[0] += current_speed
             moved = True
+        
+        self.player_velocity = ((self.player_pos[0] - self.prev_player_pos[0]) / step,
+                                (self.player_pos[1] - self.prev_player_pos[1]) / step)
+        
+        self.day_night.update(step)
+        return moved
+
+    def toggle_profiler(self):
+        # Overlay on = profiling on; --profile keeps profiling (and logging) without it
+        if self.profiler_overlay is None:
+            font = pygame.font.SysFont("consolas,menlo,dejavusansmono,couriernew,monospace", 14)
+            self.profiler_overlay = ProfilerOverlay(self.profiler, font)
+        self.show_profiler = not self.show_profiler
+        self.profiler.enabled = self.show_profiler or bool(self.profiler.log_interval)
+
+    def dump_profile(self):
+        if not self.profiler.frames:
+            return
+        path = self.profiler.dump_csv()
+        if self.profiler_overlay:
+            self.profiler_overlay.notify(f"Saved {path}")
+
+    def handle_game(self):
+        prof = self.profiler # Frame begun in run() so the network pump is included
+        # Check Pause
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT: self.running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == self.input_manager.bindings['PAUSE']:
+                    self.paused = True
+                    self.game_snapshot = self.screen.copy()
+                    return
+                if event.key == self.input_manager.bindings['PROFILER']:
+                    self.toggle_profiler()
+                elif event.key == self.input_manager.bindings['PROFILER_DUMP']:
+                    self.dump_profile()
+        prof.mark('input')
+
+        # Simulation runs in fixed steps; rendering interpolates between the last two
+        moved = False
+        for _ in range(self.sim_clock.advance(self.scheduler.raw_dt)):
+            if self.simulate(self.sim_clock.step):
+                moved = True
             
         if self.input_manager.is_pressed('PAUSE'): # Escape
             self.paused = True
             
         if moved and self.connected:
              self.send_json({"type": "MOVE", "pos": {"x": self.player_pos[0], "y": self.player_pos[1]}})
+        prof.mark('simulate')
 
         # Update Systems
-        self.camera.update(self.player_pos)
-        
-        # Day Night Step (DISABLED FOR STABILITY)
-        dt = 1/60 * 5 
-        # self.day_night.update(dt)
+        alpha = self.sim_clock.alpha
+        render_pos = (self.prev_player_pos[0] + (self.player_pos[0] - self.prev_player_pos[0]) * alpha,
+                      self.prev_player_pos[1] + (self.player_pos[1] - self.prev_player_pos[1]) * alpha)
+        self.camera.update(render_pos)
+        view = View(self.camera) # Shared by every render pass this frame
+        self.map_system.update(self.camera, self.player_velocity, view)
+        prof.mark('map_update')
 
         # Draw World Layer 1: Ground
         self.screen.fill(BG_COLOR)
-        self.map_system.draw(self.screen, self.camera)
+        self.map_system.draw(self.screen, self.camera, view)
+        prof.mark('ground')
         
-        # Collect Renderables for Y-Sort (Players, Vegetation, Animals)
-        renderables = []
+        # Collect Renderables for Y-Sort (Players; vegetation is merged in pre-sorted)
+        rq = self.render_queue
+        rq.clear()
         
         # 1. Self
-        renderables.append({
-            'type': 'player',
-            'y': self.player_pos[1],
-            'x': self.player_pos[0],
-            'data': {'app': self.my_appearance, 'name': self.username}
-        })
+        rq.push(DRAW_PLAYER, render_pos[0], render_pos[1], self.my_appearance, self.username)
         
         # 2. Others
         for pid, pdata in self.other_players.items():
-            if pdata.get('pos'):
-                renderables.append({
-                    'type': 'player',
-                    'y': pdata['pos']['y'],
-                    'x': pdata['pos']['x'],
-                    'data': {'app': pdata.get('appearance'), 'name': pdata.get('username')}
-                })
-        
-        # 3. Vegetation
-        visible_veg = self.map_system.get_visible_vegetation(self.camera)
-        for veg in visible_veg:
-            renderables.append({
-                'type': 'vegetation',
-                'y': veg.y,
-                'x': veg.x,
-                'data': veg
-            })
-            
-        # Sort by Y
-        renderables.sort(key=lambda r: r['y'])
-        
-        # Draw Loop
-        zoom = self.camera.zoom_level
-        
-        for r in renderables:
-            sx, sy = self.camera.apply_pos(r['x'], r['y'])
-            
-            # Culling
-            if -128 < sx < SCREEN_WIDTH and -128 < sy < SCREEN_HEIGHT:
-                if r['type'] == 'player':
-                    self.draw_character(self.screen, sx, sy, r['data']['app'], zoom)
-                    # Name
-                    name_surf = self.msg_font.render(r['data']['name'], True, (255, 255, 255))
-                    self.screen.blit(name_surf, (sx, sy - 20))
-                    
-                elif r['type'] == 'vegetation':
-                    veg = r['data']
-                    asset = self.map_system.assets.get(veg.type)
-                    if asset:
-                        # Simple draw without sway for now to test stability
-                        # Scale
-                        w = int(asset.get_width() * zoom)
-                        h = int(asset.get_height() * zoom)
-                        scaled = pygame.transform.scale(asset, (w, h))
-                        self.screen.blit(scaled, (sx, sy - h + 32*zoom))
-
-        # --- VISUAL FX DISABLED ---
-        # No Darkness, No Lights, No Fireflies for now.
+            pos = pdata.get('pos')
+            if pos:
+                rq.push(DRAW_PLAYER, pos['x'], pos['y'], pdata.get('appearance'), pdata.get('username'))
+        prof.mark('collect')
+        
+        # 3. Vegetation (culled to the view and y-sorted; x/y are tile coords)
+        visible_veg = self.map_system.get_visible_vegetation(self.camera, view)
+        prof.mark('vegetation_query')
+            
+        # Sort players by Y, then draw merged with vegetation
+        rq.sort()
+        prof.mark('sort')
+        rq.flush(visible_veg, TILE_SIZE, self.draw_queued_entity, self.draw_queued_vegetation)
+        prof.mark('entities')
+
+        # Ambient particles: leaves/wind are lit like the world, fireflies glow on top
+        fx = self.particles
+        if fx:
+            # Smoothed dt: effects are frame-rate dependent, so one slow frame shouldn't make them jump
+            fx.update(self.delta_time, view)
+            fx.draw(self.screen, self.camera, (particles.LEAF, particles.WIND))
+        self.draw_lighting(render_pos)
+        if fx:
+            if self.day_night.get_alpha() > 0:
+                fx.draw(self.screen, self.camera, (particles.FIREFLY,), pygame.BLEND_RGB_ADD)
+            fx.end_frame()
+        prof.mark('effects')
         
         # UI
         if self.compass_img:
@@ -801,15 +921,37 @@ class GameClient:
 
         # Connection status
         if not self.connected:
-            text = self.font.render("Lost Connection!", True, (255, 100, 100))
+            text = render_text(self.font, "Lost Connection!", True, (255, 100, 100))
             self.screen.blit(text, (10, 10))
+        prof.mark('hud')
+        if self.show_profiler:
+            self.profiler_overlay.draw(self.screen)
+            prof.mark('overlay')
 
+        self.active_ui = None
         pygame.display.flip()
+        prof.mark('flip')
+        prof.end_frame()
+        if self.paused:
+            self.game_snapshot = self.screen.copy()
+
+    def frame_mode(self):
+        # Menus sleep until input; gameplay drops to IDLE_FPS when the window isn't focused
+        if self.state == "LOADING":
+            return ACTIVE
+        if self.state != "GAME" or self.paused:
+            return STATIC
+        if not pygame.display.get_active() or not pygame.key.get_focused():
+            return IDLE
+        return ACTIVE
 
     def run(self):
-        logging.info("Entering main loop...")
+        log.info("Entering main loop...")
         while self.running:
-            self.clock.tick(FPS)
+            self.delta_time = self.scheduler.wait(self.frame_mode())
+            
+            if self.asset_loader and not self.assets_done and self.state != "LOADING":
+                self.poll_assets()
             
             if self.state == "LOADING":
                 self.update_loading()
@@ -832,7 +974,9 @@ class GameClient:
                 self.handle_create_character_screen()
                 
             elif self.state == "GAME":
+                self.profiler.begin_frame()
                 self.process_network_messages()
+                self.profiler.mark('network')
                 if self.paused:
                     if self.show_controls:
                         self.handle_controls_screen()
@@ -841,15 +985,23 @@ class GameClient:
                 else:
                     self.handle_game()
             
-        logging.info("Quitting pygame...")
+        log.info("Quitting pygame...")
+        self.map_system.shutdown()
         pygame.quit()
         sys.exit()
 
 if __name__ == "__main__":
     try:
         game = GameClient()
+        if "--profile" in sys.argv or "--memory" in sys.argv:
+            # Logging mode: stage summary every 10 s plus a line per hitch
+            game.profiler.enabled = True
+            game.profiler.log_interval = 10
+        if "--memory" in sys.argv:
+            # Adds GC pauses and allocations (tracemalloc) to the summaries, hitch lines and CSV dumps
+            game.profiler.attach_memory(trace=True)
         game.run()
     except Exception as e:
-        logging.critical("CRASH DETECTED!", exc_info=True)
+        log.critical("CRASH DETECTED!", exc_info=True)
         print("CRASH DETECTED! Check client_debug.log")
         input("Press Enter to exit...")
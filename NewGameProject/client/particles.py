@@ -0,0 +1,136 @@
+import time
+
+import pygame
+
+try:
+    import numpy
+except ImportError:
+    numpy = None # Ambient particles are skipped without numpy
+
+AVAILABLE = numpy is not None
+
+# Particle kinds
+FIREFLY = 0 # Night only, drawn additively after the lighting pass
+LEAF = 1
+WIND = 2 # Wind streaks
+
+# kind -> share of the particle pool, base velocity (px/s), wobble (px/s), wobble frequency
+KIND_PARAMS = {
+    FIREFLY: (0.2, (0, 0), 25, 1.0),
+    LEAF: (0.5, (30, 40), 40, 1.5),
+    WIND: (0.3, (260, 10), 5, 0.5),
+}
+SIZES = 3 # Sprite variants per kind
+
+def make_sprites():
+    # kind -> [Surface] per size variant; small, so blitting thousands stays cheap
+    sprites = {FIREFLY: [], LEAF: [], WIND: []}
+    for s in range(SIZES):
+        r = 2 + s
+        glow = pygame.Surface((r * 4, r * 4))
+        for i in range(r * 2, 0, -1):
+            f = (1 - i / (r * 2)) ** 2
+            pygame.draw.circle(glow, (int(150 * f), int(255 * f), int(100 * f)), (r * 2, r * 2), i)
+        sprites[FIREFLY].append(glow)
+
+        leaf = pygame.Surface((4 + s * 2, 2 + s), pygame.SRCALPHA)
+        pygame.draw.ellipse(leaf, (140 - s * 20, 110 + s * 20, 40, 220), leaf.get_rect())
+        sprites[LEAF].append(leaf)
+
+        streak = pygame.Surface((24 + s * 12, 1), pygame.SRCALPHA)
+        streak.fill((255, 255, 255, 40 + s * 15))
+        sprites[WIND].append(streak)
+    return sprites
+
+class ParticleSystem:
+    # Ambient particles in flat numpy arrays (world coords), one vectorized update
+    # per frame. The field wraps around the view, so particles leaving one edge
+    # come back on the other and nothing is ever allocated or respawned.
+    # Work is held to budget_ms: the active count shrinks when a frame runs over
+    # and grows back when there is headroom.
+    def __init__(self, capacity=2000, budget_ms=2.0, seed=None):
+        self.capacity = capacity
+        self.active = capacity
+        self.budget_ms = budget_ms
+        self.sprites = None # Built on first draw (needs pygame initialised)
+        rng = numpy.random.default_rng(seed)
+
+        # Kinds are laid out in blocks, shuffled so shrinking `active` thins every kind evenly
+        shares = [KIND_PARAMS[k][0] for k in (FIREFLY, LEAF, WIND)]
+        counts = [int(capacity * s) for s in shares]
+        counts[-1] = capacity - sum(counts[:-1])
+        self.kind = rng.permutation(numpy.repeat(numpy.arange(3, dtype=numpy.int8), counts))
+
+        self.x = rng.random(capacity, dtype=numpy.float32) # Normalised until the first update()
+        self.y = rng.random(capacity, dtype=numpy.float32)
+        self.phase = rng.random(capacity, dtype=numpy.float32) * numpy.float32(2 * numpy.pi)
+        self.size = rng.integers(0, SIZES, capacity, dtype=numpy.int8)
+        params = [KIND_PARAMS[k] for k in (FIREFLY, LEAF, WIND)]
+        speed = 0.7 + rng.random(capacity, dtype=numpy.float32) * 0.6 # +-30% per particle
+        self.vx = numpy.array([p[1][0] for p in params], dtype=numpy.float32)[self.kind] * speed
+        self.vy = numpy.array([p[1][1] for p in params], dtype=numpy.float32)[self.kind] * speed
+        self.wobble = numpy.array([p[2] for p in params], dtype=numpy.float32)[self.kind]
+        self.freq = numpy.array([p[3] for p in params], dtype=numpy.float32)[self.kind]
+        self.region = None # (x0, y0, w, h) in world px
+        self.t = 0.0
+        self.spent_ms = 0.0 # Update + draw time this frame
+
+    def update(self, dt, view, wind=1.0):
+        # view: game_engine.View for this frame; wind scales horizontal drift
+        start = time.perf_counter()
+        pad = 64
+        x0, y0 = view.min_wx - pad, view.min_wy - pad
+        w, h = view.max_wx - view.min_wx + pad * 2, view.max_wy - view.min_wy + pad * 2
+        if self.region is None:
+            # First frame: spread the normalised positions over the view
+            self.x *= numpy.float32(w)
+            self.x += numpy.float32(x0)
+            self.y *= numpy.float32(h)
+            self.y += numpy.float32(y0)
+        self.region = (x0, y0, w, h)
+        self.t += dt
+
+        n = self.active
+        x, y = self.x[:n], self.y[:n]
+        arg = self.freq[:n] * numpy.float32(self.t) + self.phase[:n]
+        x += (self.vx[:n] * numpy.float32(wind) + self.wobble[:n] * numpy.sin(arg)) * numpy.float32(dt)
+        y += (self.vy[:n] + self.wobble[:n] * numpy.cos(arg * numpy.float32(0.5))) * numpy.float32(dt)
+        # Wrap into the region around the view
+        x -= numpy.float32(x0)
+        numpy.mod(x, numpy.float32(w), out=x)
+        x += numpy.float32(x0)
+        y -= numpy.float32(y0)
+        numpy.mod(y, numpy.float32(h), out=y)
+        y += numpy.float32(y0)
+        self.spent_ms = (time.perf_counter() - start) * 1000
+
+    def draw(self, screen, camera, kinds, special_flags=0):
+        # One Surface.blits call for every visible particle of the given kinds
+        if self.region is None:
+            return
+        start = time.perf_counter()
+        if self.sprites is None:
+            self.sprites = make_sprites()
+        n = self.active
+        zoom = camera.zoom_level
+        cx, cy = camera.width // 2, camera.height // 2
+        sx = ((self.x[:n] + camera.camera.x - cx) * zoom + cx).astype(numpy.int32)
+        sy = ((self.y[:n] + camera.camera.y - cy) * zoom + cy).astype(numpy.int32)
+        mask = (sx >= 0) & (sx < camera.width) & (sy >= 0) & (sy < camera.height)
+        mask &= numpy.isin(self.kind[:n], kinds)
+        idx = numpy.flatnonzero(mask)
+
+        sprites = self.sprites
+        kind, size = self.kind, self.size
+        screen.blits([(sprites[k][s], (px, py), None, special_flags)
+                      for k, s, px, py in zip(kind[idx].tolist(), size[idx].tolist(), sx[idx].tolist(), sy[idx].tolist())],
+                     doreturn=False)
+        self.spent_ms += (time.perf_counter() - start) * 1000
+
+    def end_frame(self):
+        # Adapt the active count to this frame's update + draw cost
+        if self.spent_ms > self.budget_ms:
+            self.active = max(self.capacity // 10, int(self.active * 0.9))
+        elif self.spent_ms < self.budget_ms * 0.5 and self.active < self.capacity:
+            self.active = min(self.capacity, self.active + self.capacity // 50 + 1)
+        self.spent_ms = 0.0
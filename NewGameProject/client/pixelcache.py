@@ -0,0 +1,109 @@
+import os
+import mmap
+import struct
+import hashlib
+import logging
+
+import pygame
+
+from logsetup import kv
+
+log = logging.getLogger('client.assets')
+
+# Decoded (and already cropped/scaled) pixels, one file per asset:
+# HEADER + raw RGB/RGBA rows. Warm starts map the file and wrap it with
+# frombuffer instead of decoding and scaling the PNG again. An entry is only
+# valid for the same source file and the same prepare parameters (the key,
+# e.g. crop rect, target size and TILE_SIZE), stored as a sha1.
+CACHE_DIR = "asset_cache"
+CACHE_MAGIC = b'RAWP'
+CACHE_VERSION = 2 # Bump when the prepare step's code (not its parameters) changes output
+HEADER = struct.Struct('<4sIqq20s20sIIB') # magic, version, src mtime_ns, src size, src sha1, key sha1, w, h, alpha
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.digest()
+
+def key_sha1(key):
+    # key: any repr-stable value (tuples of numbers/None)
+    return hashlib.sha1(repr(key).encode('utf-8')).digest()
+
+class PixelCache:
+    # Safe to use from the AssetLoader's worker threads: each name is only
+    # loaded/stored by one thread and files are replaced atomically.
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            log.error("Pixel cache disabled", extra=kv(error=e))
+            self.directory = None
+
+    def cache_path(self, name):
+        return os.path.join(self.directory, name.replace('/', '_') + ".raw")
+
+    def get(self, name, path, build, alpha=True, key=None):
+        # Surface for name (built from source path by build() on a miss), or None
+        # if the source is missing. Returned surfaces are not display-converted;
+        # alpha=False stores RGB only. key describes what build() does to the source.
+        if not os.path.exists(path):
+            return None
+        if self.directory is None:
+            return build()
+        key = key_sha1(key)
+        surf = self.load(name, path, key)
+        if surf is not None:
+            self.hits += 1
+            return surf
+        self.misses += 1
+        surf = build()
+        if surf is not None:
+            self.store(name, path, surf, alpha, key)
+        return surf
+
+    def load(self, name, path, key):
+        cache_path = self.cache_path(name)
+        try:
+            with open(cache_path, 'r+b') as f:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return None
+                magic, version, mtime_ns, size, sha1, cached_key, w, h, alpha = HEADER.unpack(header)
+                if magic != CACHE_MAGIC or version != CACHE_VERSION or cached_key != key:
+                    return None
+                st = os.stat(path)
+                if (mtime_ns, size) != (st.st_mtime_ns, st.st_size):
+                    # Touched (checkout, copy) but maybe not changed: compare content
+                    if size != st.st_size or sha1 != file_sha1(path):
+                        return None
+                    f.seek(0)
+                    f.write(HEADER.pack(magic, version, st.st_mtime_ns, size, sha1, key, w, h, alpha))
+                    f.flush()
+                bpp = 4 if alpha else 3
+                if os.fstat(f.fileno()).st_size != HEADER.size + w * h * bpp:
+                    return None
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, struct.error):
+            return None
+        # The surface keeps the mapping alive until it is converted and dropped
+        return pygame.image.frombuffer(memoryview(mm)[HEADER.size:], (w, h), 'RGBA' if alpha else 'RGB')
+
+    def store(self, name, path, surf, alpha, key):
+        fmt = 'RGBA' if alpha else 'RGB'
+        cache_path = self.cache_path(name)
+        tmp_path = cache_path + ".tmp"
+        try:
+            st = os.stat(path)
+            w, h = surf.get_size()
+            header = HEADER.pack(CACHE_MAGIC, CACHE_VERSION, st.st_mtime_ns, st.st_size, file_sha1(path), key, w, h, 1 if alpha else 0)
+            with open(tmp_path, 'wb') as f:
+                f.write(header)
+                f.write(pygame.image.tobytes(surf, fmt))
+            os.replace(tmp_path, cache_path)
+        except (OSError, pygame.error) as e:
+            log.error("Failed to cache pixels", extra=kv(asset=name, error=e))
@@ -0,0 +1,320 @@
+import gc
+import os
+import sys
+import time
+import logging
+import tracemalloc
+from collections import deque
+
+import pygame
+
+from logsetup import kv
+
+log = logging.getLogger('client.perf')
+
+class MemoryMonitor:
+    # Per-frame garbage collection and allocation numbers, kept in step with
+    # FrameProfiler's frames so stutters can be matched to collections:
+    # - gc: time spent in collections during the frame (gc.callbacks) and the
+    #   oldest generation collected
+    # - blocks: net change in allocated memory blocks (sys.getallocatedblocks)
+    # - alloc/peak: with trace on, net and high-water bytes allocated during
+    #   the frame (tracemalloc), plus snapshot diffs naming the allocation sites.
+    #   Tracing slows allocation-heavy code down a lot; compare frames with it
+    #   on against each other, not against untraced runs.
+    def __init__(self, window=600, trace=False, trace_depth=1):
+        self.frames = deque(maxlen=window) # (gc seconds, collections, oldest generation or -1, blocks, alloc bytes, peak bytes)
+        self.trace = trace
+        self.trace_depth = trace_depth
+        self.started_tracing = False
+        self.snapshot = None
+        self.gc_start = 0.0
+        self.gc_seconds = 0.0
+        self.gc_runs = 0
+        self.gc_generation = -1
+        self.frame_blocks = 0
+        self.frame_bytes = 0
+
+    def start(self):
+        if self.on_gc not in gc.callbacks:
+            gc.callbacks.append(self.on_gc)
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_depth)
+            self.started_tracing = True
+        if self.trace:
+            self.snapshot = self.take_snapshot()
+
+    def stop(self):
+        if self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        self.snapshot = None
+
+    def on_gc(self, phase, info):
+        if phase == 'start':
+            self.gc_start = time.perf_counter()
+            return
+        self.gc_seconds += time.perf_counter() - self.gc_start
+        self.gc_runs += 1
+        self.gc_generation = max(self.gc_generation, info['generation'])
+
+    def begin_frame(self):
+        self.gc_seconds = 0.0
+        self.gc_runs = 0
+        self.gc_generation = -1
+        self.frame_blocks = sys.getallocatedblocks()
+        if self.trace:
+            tracemalloc.reset_peak()
+            self.frame_bytes = tracemalloc.get_traced_memory()[0]
+
+    def end_frame(self):
+        alloc = peak = 0
+        if self.trace:
+            current, high = tracemalloc.get_traced_memory()
+            alloc, peak = current - self.frame_bytes, high - self.frame_bytes
+        record = (self.gc_seconds, self.gc_runs, self.gc_generation,
+                  sys.getallocatedblocks() - self.frame_blocks, alloc, peak)
+        self.frames.append(record)
+        return record
+
+    def take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__), # The profiler's own frame records
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+
+    def top_sites(self, limit=10):
+        # Lines whose live allocations grew most since the last call: (site, +blocks, +bytes)
+        if not self.trace or not tracemalloc.is_tracing():
+            return []
+        snapshot = self.take_snapshot()
+        stats = snapshot.compare_to(self.snapshot, 'lineno') if self.snapshot else snapshot.statistics('lineno')
+        self.snapshot = snapshot
+        stats = sorted(stats, key=lambda s: -getattr(s, 'count_diff', s.count))[:limit]
+        return [(f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+                 getattr(s, 'count_diff', s.count), getattr(s, 'size_diff', s.size)) for s in stats]
+
+    def summary(self):
+        # Totals over the window: collections, gc time and per-frame allocation
+        if not self.frames:
+            return {}
+        n = len(self.frames)
+        return {
+            "gc_runs": sum(f[1] for f in self.frames),
+            "gc_ms": round(sum(f[0] for f in self.frames) * 1000, 2),
+            "gc_worst_ms": round(max(f[0] for f in self.frames) * 1000, 2),
+            "full_collections": sum(1 for f in self.frames if f[2] == 2),
+            "blocks_per_frame": round(sum(f[3] for f in self.frames) / n, 1),
+            "alloc_kb_per_frame": round(sum(f[4] for f in self.frames) / n / 1024, 1),
+            "peak_kb_per_frame": round(sum(f[5] for f in self.frames) / n / 1024, 1),
+        }
+
+class FrameProfiler:
+    # Per-stage frame timings over a rolling window of frames. The frame loop
+    # calls begin_frame(), then mark(stage) after each stage (time since the
+    # previous mark is charged to that stage), then end_frame(). Everything is
+    # a no-op while disabled, so the marks can stay in the loop. Enabling takes
+    # effect at the next begin_frame(); a frame already under way isn't recorded.
+    # With log_interval set it also logs a summary every log_interval seconds
+    # and the stage breakdown of every frame over hitch_ms. Attaching a
+    # MemoryMonitor adds GC and allocation numbers to all of that.
+    def __init__(self, window=600, log_interval=0, hitch_ms=50):
+        self.window = window
+        self.memory = None # Optional MemoryMonitor, see attach_memory()
+        self.enabled = False
+        self.log_interval = log_interval # Seconds between summaries (0 = no logging)
+        self.hitch_ms = hitch_ms
+        self.stages = [] # Stage names in first-seen order
+        self.frames = deque(maxlen=window) # (start time, {stage: seconds, 'frame': total})
+        self.current = {}
+        self.in_frame = False # begin_frame() ran while enabled
+        self.frame_start = 0.0
+        self.last = 0.0
+        self.last_log = time.perf_counter()
+
+    def begin_frame(self):
+        self.in_frame = self.enabled
+        if not self.enabled:
+            return
+        if self.memory:
+            self.memory.begin_frame()
+        self.frame_start = self.last = time.perf_counter()
+        self.current = {}
+
+    def mark(self, stage):
+        if not self.in_frame:
+            return
+        now = time.perf_counter()
+        self.current[stage] = self.current.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def end_frame(self):
+        if not self.in_frame or not self.current:
+            return
+        self.in_frame = False
+        now = time.perf_counter()
+        current = self.current
+        current['frame'] = now - self.frame_start
+        for stage in current:
+            if stage != 'frame' and stage not in self.stages:
+                self.stages.append(stage)
+        self.frames.append((self.frame_start, current))
+        self.current = {}
+        memory = self.memory.end_frame() if self.memory else None
+
+        if self.log_interval:
+            if current['frame'] * 1000 > self.hitch_ms:
+                worst = sorted(current.items(), key=lambda kv: -kv[1])[1:4] # [0] is the total
+                fields = {stage: round(seconds * 1000, 1) for stage, seconds in worst}
+                if memory:
+                    gc_seconds, gc_runs, generation, blocks, alloc, peak = memory
+                    fields.update(gc_ms=round(gc_seconds * 1000, 2), gc_gen=generation, blocks=blocks)
+                    if self.memory.trace:
+                        fields.update(alloc_kb=round(alloc / 1024, 1), peak_kb=round(peak / 1024, 1))
+                log.warning("Frame hitch", extra=kv(ms=round(current['frame'] * 1000, 1), **fields))
+            if now - self.last_log >= self.log_interval:
+                self.last_log = now
+                log.info("Frame profile", extra=kv(ms="p50/p95/p99", **{stage: f"{r['p50']:.2f}/{r['p95']:.2f}/{r['p99']:.2f}"
+                                                                        for stage, r in self.report().items()}))
+                if self.memory:
+                    self.log_memory()
+
+    def attach_memory(self, trace=False):
+        # GC timing always; trace=True also runs tracemalloc
+        self.memory = MemoryMonitor(self.window, trace)
+        self.memory.start()
+        self.reset() # Keep frames and memory.frames in step
+        return self.memory
+
+    def log_memory(self):
+        # Window totals, hitches split by whether a collection ran in them, and
+        # the allocation sites that grew most since the previous summary
+        # (the snapshot can take a few hundred ms; it runs between frames, so it
+        # stalls the game once per summary but never shows up as a hitch)
+        hitch = self.hitch_ms / 1000
+        frames = [(f['frame'], m) for (t, f), m in zip(self.frames, self.memory.frames)]
+        hitches = [m for seconds, m in frames if seconds > hitch]
+        log.info("Memory profile", extra=kv(**self.memory.summary(), hitches=len(hitches),
+                                            hitches_with_gc=sum(1 for m in hitches if m[1])))
+        for site, blocks, size in self.memory.top_sites(5):
+            log.info("Allocation site", extra=kv(site=site, blocks=f"{blocks:+d}", kb=f"{size / 1024:+.1f}"))
+
+    def reset(self):
+        self.stages = []
+        self.frames.clear()
+        self.current = {}
+        if self.memory:
+            self.memory.frames.clear()
+
+    def values(self, stage):
+        # Seconds per frame for the stage over the window (0 when it didn't run)
+        return [f.get(stage, 0.0) for t, f in self.frames]
+
+    def percentiles(self, stage, ps=(50, 95, 99)):
+        # Milliseconds for each percentile (nearest rank) of the stage's window
+        values = sorted(self.values(stage))
+        if not values:
+            return [0.0 for p in ps]
+        return [values[min(len(values) - 1, int(len(values) * p / 100))] * 1000 for p in ps]
+
+    def report(self):
+        # {stage: {p50, p95, p99, mean}} in ms, stages in loop order then 'frame'
+        out = {}
+        if not self.frames:
+            return out
+        for stage in self.stages + ['frame']:
+            p50, p95, p99 = self.percentiles(stage)
+            values = self.values(stage)
+            out[stage] = {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3),
+                          "mean": round(sum(values) / len(values) * 1000, 3)}
+        if self.memory and self.memory.frames:
+            # GC time lands inside whichever stage it interrupted; this row is not added to 'frame'
+            values = sorted(m[0] for m in self.memory.frames)
+            p50, p95, p99 = (values[min(len(values) - 1, int(len(values) * p / 100))] * 1000 for p in (50, 95, 99))
+            out['gc'] = {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3),
+                         "mean": round(sum(values) / len(values) * 1000, 3)}
+        return out
+
+    def dump_csv(self, path=None):
+        # One row per frame in the window, stage times in ms. Returns the path.
+        path = path or time.strftime("frame_profile_%Y%m%d_%H%M%S.csv")
+        stages = self.stages + ['frame']
+        memory = list(self.memory.frames) if self.memory else []
+        columns = stages + (['gc_ms', 'gc_runs', 'gc_gen', 'blocks', 'alloc_kb', 'peak_kb'] if memory else [])
+        with open(path, "w") as f:
+            f.write("time_s," + ",".join(columns) + "\n")
+            t0 = self.frames[0][0] if self.frames else 0.0
+            for i, (start, frame) in enumerate(self.frames):
+                row = [f"{frame.get(s, 0.0) * 1000:.3f}" for s in stages]
+                if i < len(memory):
+                    gc_seconds, gc_runs, generation, blocks, alloc, peak = memory[i]
+                    row += [f"{gc_seconds * 1000:.3f}", str(gc_runs), str(generation), str(blocks),
+                            f"{alloc / 1024:.1f}", f"{peak / 1024:.1f}"]
+                f.write(f"{start - t0:.4f}," + ",".join(row) + "\n")
+        log.info("Frame profile written", extra=kv(path=path, frames=len(self.frames)))
+        return path
+
+class ProfilerOverlay:
+    # Stage table and frame-time graph drawn over the game. The table text only
+    # changes every refresh seconds so the overlay doesn't profile itself.
+    GRAPH_FRAMES = 240
+    GRAPH_HEIGHT = 80
+    GRAPH_MAX_MS = 50.0 # Top of the graph
+    REFERENCE_MS = (16.7, 33.3) # 60 and 30 FPS lines
+
+    def __init__(self, profiler, font, refresh=0.5):
+        self.profiler = profiler
+        self.font = font
+        self.refresh = refresh
+        self.lines = [] # Rendered table rows
+        self.last_refresh = 0.0
+        self.message = None # (text surface, expiry time), e.g. after a CSV dump
+        self.panel = None
+
+    def notify(self, text):
+        self.message = (self.font.render(text, True, (255, 255, 0)), time.perf_counter() + 3)
+
+    def rebuild(self):
+        report = self.profiler.report()
+        rows = [f"{'stage':18s}{'p50':>7s}{'p95':>7s}{'p99':>7s}"]
+        rows += [f"{stage:18s}{r['p50']:7.2f}{r['p95']:7.2f}{r['p99']:7.2f}" for stage, r in report.items()]
+        self.lines = [self.font.render(row, True, (255, 255, 255)) for row in rows]
+        width = max([line.get_width() for line in self.lines] + [self.GRAPH_FRAMES]) + 16
+        height = sum(line.get_height() for line in self.lines) + self.GRAPH_HEIGHT + 24
+        if self.panel is None or self.panel.get_size() != (width, height):
+            self.panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.panel.fill((0, 0, 0, 170))
+
+    def draw(self, screen, x=10, y=40):
+        now = time.perf_counter()
+        if now - self.last_refresh >= self.refresh or self.panel is None:
+            self.last_refresh = now
+            self.rebuild()
+        screen.blit(self.panel, (x, y))
+        ty = y + 8
+        for line in self.lines:
+            screen.blit(line, (x + 8, ty))
+            ty += line.get_height()
+
+        # Frame-time graph, newest on the right
+        gx, gy = x + 8, ty + 8
+        bottom = gy + self.GRAPH_HEIGHT
+        scale = self.GRAPH_HEIGHT / self.GRAPH_MAX_MS
+        for ms in self.REFERENCE_MS:
+            ry = bottom - int(ms * scale)
+            pygame.draw.line(screen, (90, 90, 90), (gx, ry), (gx + self.GRAPH_FRAMES, ry))
+        frames = self.profiler.frames
+        recent = [frames[i][1]['frame'] for i in range(max(0, len(frames) - self.GRAPH_FRAMES), len(frames))]
+        if len(recent) > 1:
+            points = [(gx + i, bottom - int(min(self.GRAPH_MAX_MS, ms * 1000) * scale)) for i, ms in enumerate(recent)]
+            pygame.draw.lines(screen, (100, 255, 100), False, points)
+
+        if self.message:
+            surf, expiry = self.message
+            if now < expiry:
+                screen.blit(surf, (x, bottom + 8))
+            else:
+                self.message = None
@@ -0,0 +1,125 @@
+from collections import OrderedDict
+
+# Draw command kinds for RenderQueue entity slots
+DRAW_PLAYER = 0
+
+class RenderQueue:
+    # Y-sorted draw queue for one frame, reused across frames.
+    # Moving entities (players) go into preallocated slots and are sorted by y;
+    # static vegetation arrives already y-sorted (VegetationBuffer) and is merged
+    # in during flush(), so the big list is never sorted and nothing is
+    # allocated per item.
+    def __init__(self, capacity=64):
+        self.kind = [DRAW_PLAYER] * capacity
+        self.x = [0] * capacity
+        self.y = [0] * capacity
+        self.a = [None] * capacity # Command payload (player: appearance)
+        self.b = [None] * capacity # Command payload (player: name)
+        self.order = [] # Slot indices sorted by y, kept between frames
+        self.count = 0
+
+    def clear(self):
+        self.count = 0
+
+    def push(self, kind, x, y, a=None, b=None):
+        n = self.count
+        if n == len(self.x):
+            grow = len(self.x) or 1
+            self.kind.extend([DRAW_PLAYER] * grow)
+            self.x.extend([0] * grow)
+            self.y.extend([0] * grow)
+            self.a.extend([None] * grow)
+            self.b.extend([None] * grow)
+        self.kind[n] = kind
+        self.x[n] = x
+        self.y[n] = y
+        self.a[n] = a
+        self.b[n] = b
+        self.count = n + 1
+
+    def sort(self):
+        # Entities are pushed in a stable order and move a little per frame, so last
+        # frame's permutation is nearly sorted and Timsort finishes in ~O(n)
+        if len(self.order) != self.count:
+            self.order = list(range(self.count))
+        self.order.sort(key=self.y.__getitem__)
+
+    def flush(self, veg, veg_scale, draw_entity, draw_vegetation):
+        # Merge sorted entities with y-sorted vegetation (veg.y * veg_scale = world px).
+        # draw_entity(slot) / draw_vegetation(index) are called in back-to-front order;
+        # entities draw before vegetation on equal y.
+        order = self.order
+        ys = self.y
+        veg_y = veg.y
+        n = self.count
+        m = veg.count
+        i = j = 0
+        while i < n and j < m:
+            slot = order[i]
+            if ys[slot] <= veg_y[j] * veg_scale:
+                draw_entity(slot)
+                i += 1
+            else:
+                draw_vegetation(j)
+                j += 1
+        while i < n:
+            draw_entity(order[i])
+            i += 1
+        while j < m:
+            draw_vegetation(j)
+            j += 1
+
+class SurfaceCache:
+    # Bounded LRU of pre-rendered surfaces. get() builds on miss and evicts the
+    # least recently used entry once max_items is exceeded.
+    def __init__(self, max_items=256):
+        self.items = OrderedDict()
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        surf = self.items.get(key)
+        if surf is not None:
+            self.items.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        surf = build()
+        self.items[key] = surf
+        if len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.items.clear()
+
+class TextCache:
+    # Rendered text surfaces keyed by (font, text, antialias, color), LRU-bounded
+    def __init__(self, max_items=512):
+        self.cache = SurfaceCache(max_items)
+
+    def render(self, font, text, antialias, color):
+        return self.cache.get((font, text, antialias, color), lambda: font.render(text, antialias, color))
+
+TEXT_CACHE = TextCache()
+
+def render_text(font, text, antialias, color):
+    # Drop-in for font.render(text, antialias, color) that hits TEXT_CACHE
+    return TEXT_CACHE.render(font, text, antialias, color)
+
+class TextLabel:
+    # Single text slot for values that change over time (HUD, status lines).
+    # Re-renders only when the value changes; old values are not kept around.
+    def __init__(self, font, color, antialias=True):
+        self.font = font
+        self.color = color
+        self.antialias = antialias
+        self.text = None
+        self.surface = None
+
+    def render(self, text):
+        if text != self.text:
+            self.text = text
+            self.surface = self.font.render(text, self.antialias, self.color)
+        return self.surface
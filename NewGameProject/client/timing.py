@@ -0,0 +1,107 @@
+import pygame
+
+# Frame modes for FrameScheduler.wait()
+ACTIVE = 0 # Gameplay/loading: run at the frame cap
+IDLE = 1 # Unfocused or minimized gameplay: low rate, still animating
+STATIC = 2 # Menus: sleep until input, a wake() or a long timeout
+
+# Posted by background threads (network, connect task) to wake a sleeping frame loop
+WAKE_EVENT = pygame.event.custom_type()
+
+def wake():
+    # Safe to call from any thread
+    try:
+        pygame.event.post(pygame.event.Event(WAKE_EVENT))
+    except pygame.error:
+        pass # Display already shut down
+
+class FrameScheduler:
+    # Paces the main loop. target_fps=0 means uncapped. dt is smoothed with an
+    # exponential moving average so one slow frame doesn't jolt frame-rate
+    # dependent code; raw_dt is the real last frame time.
+    def __init__(self, target_fps=60, idle_fps=10, static_timeout=0.5, smoothing=0.1):
+        self.clock = pygame.time.Clock()
+        self.target_fps = target_fps
+        self.idle_fps = idle_fps
+        self.static_timeout = static_timeout
+        self.smoothing = smoothing
+        self.raw_dt = 0.0
+        self.dt = 1.0 / target_fps if target_fps else 1.0 / 60
+        self.frame_start = pygame.time.get_ticks()
+
+    def wait(self, mode):
+        # Block until the next frame should start; returns smoothed dt in seconds
+        if mode == ACTIVE:
+            ms = self.clock.tick(self.target_fps) if self.target_fps else self.clock.tick()
+        else:
+            timeout = 1.0 / self.idle_fps if mode == IDLE else self.static_timeout
+            elapsed = (pygame.time.get_ticks() - self.frame_start) / 1000.0 # This frame's work so far
+            # Network traffic can be constant during play, so only input wakes IDLE frames
+            self.wait_for_event(max(0.0, timeout - elapsed), wake_on_network=(mode == STATIC))
+            ms = self.clock.tick()
+        self.frame_start = pygame.time.get_ticks()
+
+        self.raw_dt = ms / 1000.0
+        # Don't let a long sleep (idle/static) drag the average out for seconds afterwards
+        if mode == ACTIVE:
+            self.dt += (self.raw_dt - self.dt) * self.smoothing
+        else:
+            self.dt = min(self.raw_dt, 0.1)
+        return self.dt
+
+    def wait_for_event(self, timeout, wake_on_network=True):
+        # Sleep until an event arrives (or timeout). The handlers read the event
+        # queue themselves, so whatever wakes us is put back in its original order.
+        deadline = pygame.time.get_ticks() + int(timeout * 1000)
+        if not wake_on_network:
+            pygame.event.clear(WAKE_EVENT)
+        if pygame.event.peek():
+            return
+        while True:
+            remaining = deadline - pygame.time.get_ticks()
+            if remaining <= 0:
+                return
+            first = pygame.event.wait(remaining)
+            if first.type == pygame.NOEVENT:
+                return
+            if first.type == WAKE_EVENT and not wake_on_network:
+                continue
+            events = [first] + pygame.event.get()
+            for event in events:
+                if event.type != WAKE_EVENT:
+                    pygame.event.post(event)
+            return
+
+class FixedTimestep:
+    # Accumulator for a fixed-rate simulation decoupled from the frame rate.
+    # advance(frame_dt) returns how many steps to simulate this frame; alpha is
+    # how far (0..1) the rendered state sits between the last two steps.
+    def __init__(self, hz=60, max_steps=8):
+        self.step = 1.0 / hz
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.resuming = False
+
+    def advance(self, frame_dt):
+        if self.resuming:
+            # First frame after reset(): its dt still spans the menu, count it as one step
+            frame_dt = min(frame_dt, self.step)
+            self.resuming = False
+        self.accumulator += frame_dt
+        steps = int(self.accumulator / self.step)
+        if steps > self.max_steps:
+            # Too far behind (hitch, returning from a menu): drop the backlog
+            # rather than spiralling into ever longer frames
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step
+        self.alpha = self.accumulator / self.step
+        return steps
+
+    def reset(self):
+        # Call when (re)entering gameplay so time spent in menus isn't simulated
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.resuming = True
@@ -1,4 +1,5 @@
 import pygame
+from render import render_text
 
 class Button:
     def __init__(self, x, y, width, height, text, font, bg_color=(100, 100, 255), text_color=(255, 255, 255), hover_color=(150, 150, 255), image=None):
@@ -16,6 +17,10 @@ class Button:
     def check_hover(self, mouse_pos):
         self.is_hovered = self.rect.collidepoint(mouse_pos)
 
+    def state(self):
+        # Everything draw() depends on; UIScreen redraws when this changes
+        return (self.is_hovered, self.text)
+
     def is_clicked(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             if self.is_hovered:
@@ -35,7 +40,7 @@ class Button:
             color = self.hover_color if self.is_hovered else self.bg_color
             pygame.draw.rect(screen, color, self.rect, border_radius=5)
         
-        text_surf = self.font.render(self.text, True, self.text_color)
+        text_surf = render_text(self.font, self.text, True, self.text_color)
         text_rect = text_surf.get_rect(center=self.rect.center)
         screen.blit(text_surf, text_rect)
 
@@ -76,6 +81,9 @@ class TextInput:
                 
         return False
 
+    def state(self):
+        return (self.text, self.active)
+
     def draw(self, screen):
         # Draw background
         pygame.draw.rect(screen, self.bg_color, self.rect, border_radius=5)
@@ -101,7 +109,7 @@ class TextInput:
             display_text = self.placeholder
             color = (150, 150, 150)
         
-        text_surf = self.font.render(display_text, True, color)
+        text_surf = render_text(self.font, display_text, True, color)
         
         # Vertical center
         text_y = self.rect.y + (self.rect.height - text_surf.get_height()) // 2
@@ -112,3 +120,70 @@ class TextInput:
 
     def get_text(self):
         return self.text
+
+class Label:
+    # Text whose content/colour come from callables, for use in a UIScreen.
+    # x is the horizontal centre when centered=True, else the left edge.
+    def __init__(self, x, y, font, get_text, color=(255, 255, 255), get_color=None, centered=False):
+        self.x = x
+        self.y = y
+        self.font = font
+        self.get_text = get_text
+        self.color = color
+        self.get_color = get_color
+        self.centered = centered
+        self.rect = pygame.Rect(x, y, 0, 0)
+
+    def state(self):
+        color = self.get_color() if self.get_color else self.color
+        return (self.get_text(), color)
+
+    def draw(self, screen):
+        text, color = self.state()
+        # Only called when the state changed, so render directly rather than via the cache
+        surf = self.font.render(text, True, color)
+        if self.centered:
+            self.rect = surf.get_rect(midtop=(self.x, self.y))
+        else:
+            self.rect = surf.get_rect(topleft=(self.x, self.y))
+        screen.blit(surf, self.rect)
+
+class UIScreen:
+    # Retained-mode screen. The static layer (background, panels, titles) is painted
+    # once into a cached surface by draw_background(surface); afterwards only widgets
+    # whose state() changed are restored from it and redrawn, and only those rects
+    # are pushed with pygame.display.update(). Widgets must not overlap.
+    def __init__(self, size, draw_background, widgets=()):
+        self.size = size
+        self.draw_background = draw_background
+        self.widgets = list(widgets)
+        self.background = None
+        self.last_state = {}
+
+    def invalidate(self):
+        # Rebuild the static layer and redraw everything on the next present()
+        self.background = None
+
+    def present(self, screen):
+        if self.background is None:
+            self.background = pygame.Surface(self.size).convert()
+            self.draw_background(self.background)
+            screen.blit(self.background, (0, 0))
+            for w in self.widgets:
+                self.last_state[w] = w.state()
+                w.draw(screen)
+            pygame.display.flip()
+            return
+
+        dirty = []
+        for w in self.widgets:
+            state = w.state()
+            if state == self.last_state.get(w):
+                continue
+            self.last_state[w] = state
+            old_rect = w.rect.copy()
+            screen.blit(self.background, old_rect, old_rect)
+            w.draw(screen)
+            dirty.append(old_rect.union(w.rect))
+        if dirty:
+            pygame.display.update(dirty)
@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+# Logging shared by the client and the server: callers only put records on a
+# queue, a QueueListener thread formats them and does the file/console I/O, so
+# a slow disk or terminal never stalls the frame loop or a connection thread.
+# Both sides put this folder on sys.path before importing it.
+#
+# Records can carry key=value fields:
+#   log.warning("Send failed", extra=kv(peer=addr, error=e))
+#   -> 2026-10-19 13:34:05,123 WARNING server.net: Send failed peer=('1.2.3.4', 5) error="[Errno 32] Broken pipe"
+#
+# Levels are per subsystem (logger name) and can be overridden without code changes:
+#   GAME_LOG_LEVELS="server.net=DEBUG,server.db=WARNING" python server/server.py
+#   GAME_LOG_LEVELS="client.net=DEBUG,client.world=WARNING" python client/main.py
+
+LEVELS_ENV = 'GAME_LOG_LEVELS'
+RATE_PERIOD = 10.0 # Seconds per rate-limit window
+RATE_BURST = 5 # Identical warnings/errors let through per window
+
+def kv(**fields):
+    return {'fields': fields}
+
+def format_value(value):
+    text = str(value)
+    if not text or any(ch in text for ch in ' ="'):
+        return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return text
+
+class KeyValueFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += " " + " ".join(f"{k}={format_value(v)}" for k, v in fields.items())
+        return line
+
+class RateLimitFilter(logging.Filter):
+    # Lets RATE_BURST copies of the same warning/error (same logger, level and
+    # message template) through per RATE_PERIOD; the first one after a quiet
+    # spell reports how many were dropped as suppressed=N
+    def __init__(self, period=RATE_PERIOD, burst=RATE_BURST):
+        super().__init__()
+        self.period = period
+        self.burst = burst
+        self.windows = {} # key -> [window start, passed, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                suppressed = window[2] if window else 0
+                self.windows[key] = [now, 1, 0]
+                if len(self.windows) > 1000:
+                    self.windows = {k: w for k, w in self.windows.items() if now - w[0] < self.period}
+                if suppressed:
+                    record.fields = dict(getattr(record, 'fields', None) or {}, suppressed=suppressed)
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+def parse_levels(text):
+    # "server.net=DEBUG,server.db=WARNING" -> {'server.net': 'DEBUG', ...}
+    levels = {}
+    for part in (text or "").split(","):
+        if "=" in part:
+            name, level = part.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def setup_logging(path=None, level=logging.INFO, console=True, levels=None):
+    # Call once at startup. Returns the QueueListener (stopped automatically at exit).
+    handlers = []
+    if path:
+        handlers.append(logging.FileHandler(path, encoding='utf-8'))
+    if console:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    formatter = KeyValueFormatter()
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    for name, sub_level in dict(levels or {}, **parse_levels(os.environ.get(LEVELS_ENV))).items():
+        try:
+            logging.getLogger(name).setLevel(sub_level)
+        except (ValueError, TypeError):
+            # A typo in GAME_LOG_LEVELS must not stop the process from starting
+            logging.getLogger(__name__).warning("Unknown log level, ignored", extra=kv(logger=name, level=sub_level))
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop) # Flushes whatever is still queued
+    return listener
@@ -0,0 +1,6 @@
+@echo off
+cd /d "%~dp0"
+echo Dang chay bot swarm (can bat server truoc)...
+python server/bot_swarm.py %*
+echo.
+pause
@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import socket
+import argparse
+
+# Sends one ADMIN command to a running server (from the same machine) and prints the reply.
+# Run from the server's working directory: the token comes from GAME_ADMIN_TOKEN or the
+# admin_token file the server writes at startup.
+#
+#   python server/admin.py profile_start --interval 0.005
+#   python server/admin.py profile_status
+#   python server/admin.py profile_stop              # writes admin_output/profile_*.folded
+#   python server/admin.py record_start              # admin_output/session_*.rec for server/replay.py
+#
+# The .folded output is collapsed stacks: flamegraph.pl profile.folded > profile.svg,
+# or drop the file into https://www.speedscope.app
+
+TOKEN_FILE = 'admin_token'
+COMMANDS = ('profile_start', 'profile_stop', 'profile_dump', 'profile_status', 'record_start', 'record_stop', 'record_status')
+
+def send_command(host, port, msg, timeout=10.0):
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(json.dumps(msg).encode('utf-8'))
+        data = b''
+        decoder = json.JSONDecoder()
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("server closed the connection")
+            data += chunk
+            try:
+                reply, end = decoder.raw_decode(data.decode('utf-8'))
+                return reply
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue # Partial reply
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Server admin commands")
+    parser.add_argument('command', choices=COMMANDS)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--interval', type=float, help="Sampling interval in seconds (profile_start)")
+    parser.add_argument('--path', help="Output file name, written to the server's admin_output folder")
+    parser.add_argument('--token', default=os.environ.get('GAME_ADMIN_TOKEN', ''))
+    parser.add_argument('--token-file', default=TOKEN_FILE)
+    args = parser.parse_args(argv)
+    if not args.token and os.path.exists(args.token_file):
+        with open(args.token_file) as f:
+            args.token = f.read().strip()
+
+    msg = {"type": "ADMIN", "command": args.command, "token": args.token}
+    if args.interval is not None:
+        msg['interval'] = args.interval
+    if args.path:
+        msg['path'] = args.path
+    reply = send_command(args.host, args.port, msg)
+    print(json.dumps(reply, indent=2))
+    return 0 if reply.get('ok') else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
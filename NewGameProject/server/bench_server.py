@@ -0,0 +1,224 @@
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+# In-process server benchmarks with fake sockets: MOVE dispatch through
+# handle_client, broadcast_state, GAME_STATE encode/decode and the SQLite
+# register/login path, at several session counts.
+#
+#   python server/bench_server.py                  # run, compare with bench_baseline.json
+#   python server/bench_server.py --save-baseline  # accept current numbers as the baseline
+#
+# Exits with 1 if any benchmark's median is slower than baseline * (1 + threshold).
+# Baselines are machine specific; re-save after changing hardware.
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import server
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+DEFAULT_SESSIONS = (10, 100, 1000)
+DEFAULT_THRESHOLD = 0.25 # Allowed slowdown of a median before it counts as a regression
+TARGET_SECONDS = 0.5 # Rough time budget per benchmark and session count
+
+APPEARANCE = {"body": 0, "hair": 1, "shirt": 1, "pants": 0, "eyes": 0}
+
+class FakeConn:
+    # Stands in for a client socket: recv() replays scripted messages (one per
+    # call, like a well-behaved client) then reports a disconnect; send() only counts
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.pos = 0
+        self.bytes_sent = 0
+
+    def recv(self, size):
+        if self.pos < len(self.script):
+            self.pos += 1
+            return self.script[self.pos - 1]
+        return b''
+
+    def send(self, data):
+        self.bytes_sent += len(data)
+        return len(data)
+
+    def close(self):
+        pass
+
+class LoggedInConn(FakeConn):
+    # handle_client registers the session as logged out; mark it logged in
+    # (with a character) before the first message, skipping the DB
+    def __init__(self, script, addr_str):
+        super().__init__(script)
+        self.addr_str = addr_str
+
+    def recv(self, size):
+        if self.pos == 0:
+            server.clients[self.addr_str].update(username='bench_sender', appearance=dict(APPEARANCE))
+        return super().recv(size)
+
+def fill_sessions(n):
+    # n logged-in sessions with characters, spread over the map
+    server.clients.clear()
+    for i in range(n):
+        server.clients[str(('127.0.0.1', 10000 + i))] = {
+            'conn': FakeConn(),
+            'pos': {'x': 400 + (i % 50) * 37.5, 'y': 300 + (i // 50) * 41.25},
+            'username': f"bench_{i}",
+            'appearance': dict(APPEARANCE),
+        }
+
+def repeat(fn, ops_per_call=1):
+    # Calls fn until TARGET_SECONDS is used (at least 5 times); returns per-op seconds.
+    # GC is paused like timeit does, so collections don't land on random runs.
+    times = []
+    gc.collect()
+    gc.disable()
+    try:
+        deadline = time.perf_counter() + TARGET_SECONDS
+        while len(times) < 5 or time.perf_counter() < deadline:
+            t = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - t) / ops_per_call)
+            if len(times) >= 10000:
+                break
+    finally:
+        gc.enable()
+    return times
+
+def bench_dispatch(n):
+    # One extra session sends MOVEs through handle_client; each one is parsed,
+    # stored and broadcast to all n + 1 sessions
+    fill_sessions(n)
+    moves = [json.dumps({"type": "MOVE", "pos": {"x": 500 + i, "y": 300}}).encode('utf-8') for i in range(20)]
+    addr = ('127.0.0.1', 9999)
+    def run():
+        server.handle_client(LoggedInConn(moves, str(addr)), addr)
+    return repeat(run, len(moves))
+
+def bench_broadcast(n):
+    fill_sessions(n)
+    return repeat(lambda: server.broadcast_state(None))
+
+def game_state(n):
+    fill_sessions(n)
+    state = {k: {'pos': v['pos'], 'appearance': v['appearance'], 'username': v['username']}
+             for k, v in server.clients.items()}
+    return {"type": "GAME_STATE", "data": state}
+
+def bench_encode(n):
+    msg = game_state(n)
+    return repeat(lambda: json.dumps(msg).encode('utf-8'))
+
+def bench_decode(n):
+    data = json.dumps(game_state(n)).encode('utf-8')
+    return repeat(lambda: json.loads(data.decode('utf-8')))
+
+def bench_auth(n):
+    # Register n accounts into a fresh DB, then time logins against it
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    db_path = server.DB_PATH
+    server.DB_PATH = path
+    try:
+        server.init_db()
+        server.clients.clear()
+        conn = FakeConn()
+        for i in range(n):
+            server.handle_register({"username": f"bench_{i}", "password": "pw"}, conn)
+        addr_str = str(('127.0.0.1', 9999))
+        server.clients[addr_str] = {'conn': conn, 'pos': {'x': 0, 'y': 0}, 'username': None, 'appearance': None}
+        i = [0]
+        def login():
+            i[0] = (i[0] + 7919) % n # Stride through the table
+            server.handle_login({"username": f"bench_{i[0]}", "password": "pw"}, conn, addr_str)
+        return repeat(login)
+    finally:
+        server.DB_PATH = db_path
+        os.remove(path)
+
+BENCHMARKS = {
+    "dispatch_move": bench_dispatch,
+    "broadcast_state": bench_broadcast,
+    "game_state_encode": bench_encode,
+    "game_state_decode": bench_decode,
+    "auth_login": bench_auth,
+}
+
+def summarize(times):
+    times = sorted(times)
+    n = len(times)
+    return {
+        "runs": n,
+        "median_us": round(times[n // 2] * 1e6, 2),
+        "p95_us": round(times[min(n - 1, int(n * 0.95))] * 1e6, 2),
+        "min_us": round(times[0] * 1e6, 2),
+    }
+
+def run_all(sessions, names):
+    results = {}
+    for name in names:
+        for n in sessions:
+            times = BENCHMARKS[name](n) # Logging is not set up here, so per-connection INFO lines are dropped
+            key = f"{name}/{n}"
+            results[key] = summarize(times)
+            print(f"{key:28s} median {results[key]['median_us']:>12.2f} us   p95 {results[key]['p95_us']:>12.2f} us")
+    server.clients.clear()
+    return results
+
+def compare(results, baseline, threshold):
+    # Returns a list of (key, baseline_us, current_us) for medians over the threshold
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get("results", {}).get(key)
+        if base and current["median_us"] > base["median_us"] * (1 + threshold):
+            regressions.append((key, base["median_us"], current["median_us"]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Server benchmark suite")
+    parser.add_argument('--sessions', default=",".join(map(str, DEFAULT_SESSIONS)), help="Comma-separated session counts")
+    parser.add_argument('--only', help="Comma-separated benchmark names: " + ", ".join(BENCHMARKS))
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--json', help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    sessions = [int(s) for s in args.sessions.split(",")]
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": run_all(sessions, names),
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against (run with --save-baseline)")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(report["results"], baseline, args.threshold)
+    for key, base, current in regressions:
+        print(f"REGRESSION {key}: {base:.2f} us -> {current:.2f} us ({current / base - 1:+.0%})")
+    if regressions:
+        return 1
+    print(f"No regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
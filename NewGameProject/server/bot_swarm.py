@@ -0,0 +1,268 @@
+import asyncio
+import argparse
+import json
+import math
+import random
+import time
+from collections import deque
+
+# Headless load generator: many simulated players in one asyncio process,
+# speaking the same protocol as the game client (REGISTER, LOGIN,
+# CREATE_CHARACTER, then MOVE at a fixed rate).
+#
+#   python server/bot_swarm.py --bots 200 --rate 10 --duration 30
+#
+# Broadcast latency is the time from sending a MOVE until a GAME_STATE that
+# shows the new position comes back, i.e. what a player would see.
+
+APPEARANCE = {"body": 0, "hair": 1, "shirt": 1, "pants": 0, "eyes": 0}
+PATTERNS = ('random', 'circle', 'line', 'idle')
+REPLY_TIMEOUT = 10.0 # Seconds to wait for a login-phase reply
+
+class Stats:
+    def __init__(self):
+        self.connected = 0
+        self.ready = 0 # Bots that got through login/character creation
+        self.errors = {} # kind -> count
+        self.moves_sent = 0
+        self.states_received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latencies = [] # Seconds
+        self.login_times = [] # Seconds from connect to ready
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def percentile(self, values, p):
+        if not values:
+            return 0.0
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+    def report(self, elapsed, bots):
+        lat = [v * 1000 for v in self.latencies]
+        logins = [v * 1000 for v in self.login_times]
+        total_errors = sum(self.errors.values())
+        return {
+            "bots": bots,
+            "connected": self.connected,
+            "ready": self.ready,
+            "duration_s": round(elapsed, 2),
+            "moves_sent": self.moves_sent,
+            "moves_per_s": round(self.moves_sent / elapsed, 1) if elapsed else 0.0,
+            "states_received": self.states_received,
+            "states_per_s": round(self.states_received / elapsed, 1) if elapsed else 0.0,
+            "mb_sent": round(self.bytes_sent / 1e6, 2),
+            "mb_received": round(self.bytes_received / 1e6, 2),
+            "latency_ms": {
+                "samples": len(lat),
+                "p50": round(self.percentile(lat, 50), 2),
+                "p95": round(self.percentile(lat, 95), 2),
+                "p99": round(self.percentile(lat, 99), 2),
+                "max": round(max(lat), 2) if lat else 0.0,
+            },
+            "login_ms": {
+                "p50": round(self.percentile(logins, 50), 2),
+                "p95": round(self.percentile(logins, 95), 2),
+            },
+            "moves_unconfirmed": self.moves_sent - len(lat),
+            "errors": self.errors,
+            "error_rate": round(total_errors / max(1, self.moves_sent + bots), 4),
+        }
+
+def movement(pattern, index, speed):
+    # Returns step(t) -> (x, y) in world px for one bot
+    rng = random.Random(index)
+    cx, cy = 400 + rng.uniform(-2000, 2000), 300 + rng.uniform(-2000, 2000)
+    if pattern == 'circle':
+        radius = rng.uniform(50, 300)
+        phase = rng.uniform(0, 2 * math.pi)
+        return lambda t: (cx + math.cos(phase + t * speed / radius) * radius,
+                          cy + math.sin(phase + t * speed / radius) * radius)
+    if pattern == 'line':
+        length = rng.uniform(100, 600)
+        angle = rng.uniform(0, 2 * math.pi)
+        def step(t):
+            d = (t * speed) % (length * 2)
+            d = d if d < length else length * 2 - d # Back and forth
+            return cx + math.cos(angle) * d, cy + math.sin(angle) * d
+        return step
+    if pattern == 'idle':
+        # Stands still; tiny jitter so every MOVE is distinguishable in GAME_STATE
+        return lambda t: (cx + rng.uniform(-0.5, 0.5), cy + rng.uniform(-0.5, 0.5))
+    pos = [cx, cy]
+    heading = [rng.uniform(0, 2 * math.pi)]
+    last = [0.0]
+    def step(t):
+        dt = t - last[0]
+        last[0] = t
+        heading[0] += rng.uniform(-1.0, 1.0) * dt * 3
+        pos[0] += math.cos(heading[0]) * speed * dt
+        pos[1] += math.sin(heading[0]) * speed * dt
+        return pos[0], pos[1]
+    return step
+
+class Bot:
+    def __init__(self, index, args, stats):
+        self.index = index
+        self.args = args
+        self.stats = stats
+        self.username = f"{args.prefix}{index}"
+        self.replies = asyncio.Queue() # Non-GAME_STATE messages, in order
+        self.pending = deque() # (pos, sent_at) for MOVEs not yet seen in a GAME_STATE
+        self.key = None # Our entry in GAME_STATE (server keys clients by str(addr))
+        self.writer = None
+
+    async def send(self, msg):
+        data = json.dumps(msg).encode('utf-8')
+        self.writer.write(data)
+        await self.writer.drain()
+        self.stats.bytes_sent += len(data)
+
+    async def request(self, msg, ok_types):
+        # The server reads one message per recv(), so login-phase messages are
+        # sent one at a time, each waiting for its reply
+        await self.send(msg)
+        reply = await asyncio.wait_for(self.replies.get(), REPLY_TIMEOUT)
+        return reply if reply.get('type') in ok_types else None
+
+    async def read_loop(self, reader):
+        # Messages arrive back to back with no framing; raw_decode splits them
+        decoder = json.JSONDecoder()
+        buf = ""
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                raise ConnectionResetError("server closed connection")
+            self.stats.bytes_received += len(chunk)
+            buf += chunk.decode('utf-8', errors='replace')
+            pos = 0
+            while True:
+                while pos < len(buf) and buf[pos].isspace():
+                    pos += 1
+                try:
+                    msg, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    break # Incomplete message, wait for more
+                pos = end
+                if msg.get('type') == 'GAME_STATE':
+                    self.on_state(msg.get('data') or {})
+                else:
+                    self.replies.put_nowait(msg)
+            buf = buf[pos:]
+
+    def on_state(self, state):
+        self.stats.states_received += 1
+        me = state.get(self.key)
+        if not me or not self.pending:
+            return
+        pos = me.get('pos') or {}
+        seen = (pos.get('x'), pos.get('y'))
+        if not any(p == seen for p, t in self.pending):
+            return
+        now = time.perf_counter()
+        # Older MOVEs were superseded by this one
+        while self.pending:
+            p, sent_at = self.pending.popleft()
+            if p == seen:
+                self.stats.latencies.append(now - sent_at)
+                break
+
+    async def run(self, start_at, stop_at):
+        args = self.args
+        await asyncio.sleep(max(0.0, start_at - time.perf_counter()))
+        t0 = time.perf_counter()
+        try:
+            reader, self.writer = await asyncio.open_connection(args.host, args.port)
+        except OSError:
+            self.stats.error('connect')
+            return
+        self.stats.connected += 1
+        self.key = str(self.writer.get_extra_info('sockname'))
+        read_task = asyncio.ensure_future(self.read_loop(reader))
+        try:
+            # Account may already exist from a previous run; either way log in next
+            await self.request({"type": "REGISTER", "username": self.username, "password": args.password},
+                               ('REGISTER_SUCCESS', 'REGISTER_FAIL'))
+            login = await self.request({"type": "LOGIN", "username": self.username, "password": args.password},
+                                       ('LOGIN_SUCCESS',))
+            if not login:
+                self.stats.error('login')
+                return
+            if not login.get('has_character'):
+                if not await self.request({"type": "CREATE_CHARACTER", "appearance": APPEARANCE}, ('CREATE_CHAR_SUCCESS',)):
+                    self.stats.error('create_character')
+                    return
+            self.stats.ready += 1
+            self.stats.login_times.append(time.perf_counter() - t0)
+
+            step = movement(args.pattern, self.index, args.speed)
+            interval = 1.0 / args.rate
+            next_move = time.perf_counter() + random.uniform(0, interval) # Spread bots over the interval
+            while next_move < stop_at:
+                await asyncio.sleep(max(0.0, next_move - time.perf_counter()))
+                if read_task.done():
+                    read_task.result() # Re-raise the reader's error
+                x, y = step(next_move - t0)
+                pos = (round(x, 2), round(y, 2))
+                self.pending.append((pos, time.perf_counter()))
+                if len(self.pending) > 64:
+                    self.pending.popleft() # Never confirmed
+                await self.send({"type": "MOVE", "pos": {"x": pos[0], "y": pos[1]}})
+                self.stats.moves_sent += 1
+                next_move += interval
+        except asyncio.TimeoutError:
+            self.stats.error('timeout')
+        except (OSError, ConnectionError):
+            self.stats.error('disconnect')
+        finally:
+            read_task.cancel()
+            self.writer.close()
+
+async def swarm(args):
+    stats = Stats()
+    now = time.perf_counter()
+    stop_at = now + args.ramp + args.duration
+    bots = [Bot(i, args, stats) for i in range(args.bots)]
+    # Connections are ramped so the accept loop isn't hit all at once
+    tasks = [bot.run(now + args.ramp * i / max(1, args.bots), stop_at) for i, bot in enumerate(bots)]
+
+    async def progress():
+        while True:
+            await asyncio.sleep(5)
+            print(f"  ready {stats.ready}/{args.bots}, moves {stats.moves_sent}, states {stats.states_received}, "
+                  f"errors {sum(stats.errors.values())}")
+
+    progress_task = asyncio.ensure_future(progress())
+    await asyncio.gather(*tasks)
+    progress_task.cancel()
+    return stats.report(time.perf_counter() - now, args.bots)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated players against the game server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--bots', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=10.0, help="MOVE messages per second per bot")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds of movement after ramp-up")
+    parser.add_argument('--ramp', type=float, default=5.0, help="Seconds over which bots connect")
+    parser.add_argument('--pattern', choices=PATTERNS, default='random')
+    parser.add_argument('--speed', type=float, default=300.0, help="Movement speed in px/s")
+    parser.add_argument('--prefix', default='bot_', help="Username prefix")
+    parser.add_argument('--password', default='botpass')
+    parser.add_argument('--json', help="Also write the report to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"Swarm: {args.bots} bots, {args.rate}/s, pattern {args.pattern} -> {args.host}:{args.port}")
+    report = asyncio.run(swarm(args))
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+if __name__ == "__main__":
+    main()
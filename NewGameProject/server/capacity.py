@@ -0,0 +1,231 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import urllib.request
+
+from bot_swarm import Bot, Stats, PATTERNS
+
+# Capacity planner: adds bots to a running server in steps until state delivery
+# latency breaks the SLO, sampling the server's /metrics (CPU, RSS, threads,
+# GC pauses) throughout, and reports the largest step that stayed within it.
+#
+#   python server/server.py --soak                  # in another terminal
+#   python server/capacity.py --step 25 --slo-ms 100 --json capacity.json
+#
+# Each step waits for the new bots to log in, then measures for --step-seconds.
+# The bots run in this one process; if its own CPU gets near 100% the numbers
+# say more about the driver than the server, and the report flags it.
+
+DRIVER_SATURATED = 90.0 # Driver CPU % above which results are only a lower bound
+
+def scrape(url):
+    # Prometheus text -> {series name: value}, label sets summed per name
+    values = {}
+    with urllib.request.urlopen(url, timeout=5) as response:
+        for line in response.read().decode('utf-8').splitlines():
+            if not line or line.startswith('#'):
+                continue
+            series, value = line.rsplit(' ', 1)
+            name = series.split('{', 1)[0]
+            if name.endswith('_bucket'):
+                continue
+            values[name] = values.get(name, 0.0) + float(value)
+    return values
+
+def server_delta(before, after, seconds):
+    # Resource use between two scrapes
+    if not before or not after:
+        return {}
+    gc_runs = after.get('server_gc_pause_seconds_count', 0) - before.get('server_gc_pause_seconds_count', 0)
+    gc_time = after.get('server_gc_pause_seconds_sum', 0) - before.get('server_gc_pause_seconds_sum', 0)
+    broadcasts = after.get('server_broadcast_seconds_count', 0) - before.get('server_broadcast_seconds_count', 0)
+    broadcast_time = after.get('server_broadcast_seconds_sum', 0) - before.get('server_broadcast_seconds_sum', 0)
+    return {
+        "cpu_pct": round((after.get('server_process_cpu_seconds', 0) - before.get('server_process_cpu_seconds', 0)) / seconds * 100, 1),
+        # Absent when the server can't read its RSS on this platform
+        "rss_mb": round(after['server_process_rss_bytes'] / 2**20, 1) if 'server_process_rss_bytes' in after else None,
+        "threads": int(after.get('server_threads', 0)),
+        "sessions": int(after.get('server_sessions', 0)),
+        "gc_runs": int(gc_runs),
+        "gc_ms_per_s": round(gc_time / seconds * 1000, 2),
+        "broadcast_mean_ms": round(broadcast_time / broadcasts * 1000, 3) if broadcasts else 0.0,
+        "send_errors": int(after.get('server_send_errors_total', 0) - before.get('server_send_errors_total', 0)),
+    }
+
+def format_mb(value):
+    return "unavailable" if value is None else f"{value:.1f}"
+
+class Planner:
+    def __init__(self, args):
+        self.args = args
+        self.url = f"http://{args.host}:{args.metrics_port}/metrics"
+        self.stats = Stats()
+        self.tasks = []
+        self.bots = 0
+        self.steps = []
+        self.samples = [] # Time series for the whole run
+        self.metrics_ok = True
+        self.t0 = time.perf_counter()
+
+    async def read_metrics(self):
+        if not self.metrics_ok:
+            return None
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, scrape, self.url)
+        except (OSError, ValueError) as e:
+            print(f"  metrics unavailable ({e}); reporting latency only")
+            self.metrics_ok = False
+            return None
+
+    async def sample_loop(self):
+        prev, prev_t, prev_cpu = await self.read_metrics(), time.perf_counter(), time.process_time()
+        while True:
+            await asyncio.sleep(self.args.sample)
+            cur, now, cpu = await self.read_metrics(), time.perf_counter(), time.process_time()
+            sample = {"t": round(now - self.t0, 1), "bots": self.bots, "ready": self.stats.ready,
+                      "driver_cpu_pct": round((cpu - prev_cpu) / (now - prev_t) * 100, 1)}
+            sample.update(server_delta(prev, cur, now - prev_t))
+            self.samples.append(sample)
+            prev, prev_t, prev_cpu = cur, now, cpu
+
+    def add_bots(self, count):
+        args = self.args
+        now = time.perf_counter()
+        ramp = min(args.ramp, count * 0.05)
+        for i in range(count):
+            bot = Bot(self.bots + i, args, self.stats)
+            self.tasks.append(asyncio.ensure_future(bot.run(now + ramp * i / count, float('inf'))))
+        self.bots += count
+
+    async def wait_ready(self, timeout):
+        deadline = time.perf_counter() + timeout
+        while self.stats.ready + sum(self.stats.errors.values()) < self.bots and time.perf_counter() < deadline:
+            await asyncio.sleep(0.2)
+
+    async def measure(self):
+        args = self.args
+        stats = self.stats
+        lat_start, moves_start = len(stats.latencies), stats.moves_sent
+        errors_start = sum(stats.errors.values())
+        before, t, cpu = await self.read_metrics(), time.perf_counter(), time.process_time()
+        await asyncio.sleep(args.step_seconds)
+        after, seconds = await self.read_metrics(), time.perf_counter() - t
+        driver_cpu = (time.process_time() - cpu) / seconds * 100
+
+        window = stats.latencies[lat_start:]
+        moves = stats.moves_sent - moves_start
+        step = {
+            "bots": self.bots,
+            "ready": stats.ready,
+            "errors": sum(stats.errors.values()) - errors_start,
+            "moves": moves,
+            "confirmed": round(len(window) / moves, 3) if moves else 0.0,
+            "p50_ms": round(stats.percentile(window, 50) * 1000, 2),
+            "p95_ms": round(stats.percentile(window, 95) * 1000, 2),
+            "p99_ms": round(stats.percentile(window, 99) * 1000, 2),
+            "driver_cpu_pct": round(driver_cpu, 1),
+        }
+        step.update(server_delta(before, after, seconds))
+        return step
+
+    def breach(self, step):
+        args = self.args
+        reasons = []
+        if step[f"p{args.percentile}_ms"] > args.slo_ms:
+            reasons.append(f"p{args.percentile} {step[f'p{args.percentile}_ms']:.1f} ms > {args.slo_ms:g} ms")
+        if step["ready"] < step["bots"]:
+            reasons.append(f"only {step['ready']}/{step['bots']} bots logged in")
+        if step["confirmed"] < args.min_confirmed:
+            reasons.append(f"only {step['confirmed']:.0%} of moves confirmed")
+        return reasons
+
+    async def run(self):
+        args = self.args
+        sampler = asyncio.ensure_future(self.sample_loop())
+        print(f"{'bots':>6s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'conf':>6s} {'cpu%':>7s} {'rss MB':>8s} "
+              f"{'threads':>8s} {'gc ms/s':>8s} {'drv cpu%':>9s}")
+        capacity, breached = 0, None
+        try:
+            while self.bots < args.max:
+                self.add_bots(min(args.start if not self.bots else args.step, args.max - self.bots))
+                await self.wait_ready(args.login_timeout)
+                step = await self.measure()
+                self.steps.append(step)
+                print(f"{step['bots']:6d} {step['p50_ms']:8.1f} {step['p95_ms']:8.1f} {step['p99_ms']:8.1f} "
+                      f"{step['confirmed']:6.0%} {step.get('cpu_pct', 0):7.1f} {format_mb(step.get('rss_mb')):>8s} "
+                      f"{step.get('threads', 0):8d} {step.get('gc_ms_per_s', 0):8.2f} {step['driver_cpu_pct']:9.1f}")
+                reasons = self.breach(step)
+                if reasons:
+                    breached = {"bots": step["bots"], "reasons": reasons}
+                    break
+                capacity = step["bots"]
+        finally:
+            sampler.cancel()
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, sampler, return_exceptions=True)
+        return capacity, breached
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ramp simulated players until the latency SLO breaks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--metrics-port', type=int, default=9100)
+    parser.add_argument('--start', type=int, default=10, help="Bots in the first step")
+    parser.add_argument('--step', type=int, default=10, help="Bots added per step")
+    parser.add_argument('--max', type=int, default=1000)
+    parser.add_argument('--step-seconds', type=float, default=20.0, help="Measurement time per step")
+    parser.add_argument('--ramp', type=float, default=5.0, help="Max seconds over which a step's bots connect")
+    parser.add_argument('--login-timeout', type=float, default=30.0)
+    parser.add_argument('--slo-ms', type=float, default=100.0)
+    parser.add_argument('--percentile', type=int, choices=(50, 95, 99), default=99)
+    parser.add_argument('--min-confirmed', type=float, default=0.9, help="Min share of MOVEs seen in a GAME_STATE")
+    parser.add_argument('--sample', type=float, default=2.0, help="Seconds between metrics samples")
+    parser.add_argument('--rate', type=float, default=10.0, help="MOVE messages per second per bot")
+    parser.add_argument('--pattern', choices=PATTERNS, default='random')
+    parser.add_argument('--speed', type=float, default=300.0, help="Movement speed in px/s")
+    parser.add_argument('--prefix', default='cap_', help="Username prefix")
+    parser.add_argument('--password', default='botpass')
+    parser.add_argument('--json', help="Write the report to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"Capacity test -> {args.host}:{args.port}: p{args.percentile} <= {args.slo_ms:g} ms, "
+          f"{args.start} bots + {args.step} per {args.step_seconds:g} s step, {args.rate}/s each")
+    planner = Planner(args)
+    capacity, breached = asyncio.run(planner.run())
+
+    saturated = [s["bots"] for s in planner.steps if s["driver_cpu_pct"] > DRIVER_SATURATED]
+    if breached:
+        print(f"Capacity: {capacity} bots (SLO broken at {breached['bots']}: {'; '.join(breached['reasons'])})")
+    else:
+        print(f"Capacity: at least {capacity} bots (--max reached without breaking the SLO)")
+    if saturated:
+        print(f"WARNING: driver CPU over {DRIVER_SATURATED:g}% from {saturated[0]} bots; "
+              "latency there includes driver lag, capacity is a lower bound")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+        },
+        "capacity": capacity,
+        "breached": breached,
+        "driver_saturated_at": saturated[0] if saturated else None,
+        "steps": planner.steps,
+        "samples": planner.samples,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
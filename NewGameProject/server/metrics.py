@@ -0,0 +1,178 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal Prometheus client: counters, gauges and histograms with labels,
+# rendered in the text exposition format and served by the stdlib.
+#
+#   curl http://127.0.0.1:9100/metrics
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+class Metric:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.values = {} # label values tuple -> float
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        return [(self.name, labels, (), value) for labels, value in items]
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def __init__(self, name, help_text, labels=(), fn=None):
+        super().__init__(name, help_text, labels)
+        self.values = {}
+        self.fn = fn # Optional callback read at scrape time (unlabelled gauges); None = no sample
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def samples(self):
+        if self.fn:
+            value = self.fn()
+            return [] if value is None else [(self.name, (), (), value)]
+        with self.lock:
+            items = list(self.values.items())
+        return [(self.name, labels, (), value) for labels, value in items]
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self.values = {} # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, *labels):
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def time(self, *labels):
+        return Timer(self, labels)
+
+    def samples(self):
+        with self.lock:
+            items = [(labels, list(entry)) for labels, entry in self.values.items()]
+        out = []
+        for labels, entry in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, entry):
+                cumulative += n
+                out.append((self.name + "_bucket", labels, (("le", repr(bound)),), cumulative))
+            out.append((self.name + "_bucket", labels, (("le", "+Inf"),), entry[-1]))
+            out.append((self.name + "_sum", labels, (), entry[-2]))
+            out.append((self.name + "_count", labels, (), entry[-1]))
+        return out
+
+class Timer:
+    # with histogram.time('label'): ... observes the block's duration in seconds
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = [] # Called before each render, e.g. to fold in buffered observations
+
+    def add_collector(self, fn):
+        self.collectors.append(fn)
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=(), fn=None):
+        return self.register(Gauge(name, help_text, labels, fn))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            for name, labels, extra, value in metric.samples():
+                lines.append(f"{name}{format_labels(metric.label_names, labels, extra)} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes every few seconds would flood the console
+
+def start_http_server(port, host='127.0.0.1', registry=REGISTRY):
+    # Serves /metrics on a daemon thread; returns the HTTP server
+    handler = type("Handler", (MetricsHandler,), {"registry": registry})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    return httpd
@@ -0,0 +1,102 @@
+import gc
+import os
+import time
+import threading
+from collections import deque
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Process resource readings for the metrics endpoint and soak logging:
+# CPU time, resident memory and garbage collector pauses. psutil is used for
+# RSS when installed; otherwise GetProcessMemoryInfo (Windows) or /proc (Linux),
+# else None: callers report "unavailable" rather than a made-up 0.
+
+_process = psutil.Process() if psutil else None
+
+if not psutil and os.name == 'nt':
+    import ctypes
+    from ctypes import wintypes
+
+    class _MemoryCounters(ctypes.Structure):
+        # PROCESS_MEMORY_COUNTERS
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    _kernel32 = ctypes.WinDLL('kernel32')
+    _kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    _psapi = ctypes.WinDLL('psapi')
+    _psapi.GetProcessMemoryInfo.argtypes = (wintypes.HANDLE, ctypes.POINTER(_MemoryCounters), wintypes.DWORD)
+    _psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+
+def cpu_seconds():
+    # User + system CPU time of the whole process
+    return time.process_time()
+
+def rss_bytes():
+    # Resident memory in bytes, or None if this platform gives no way to read it
+    if _process:
+        return _process.memory_info().rss
+    if os.name == 'nt':
+        counters = _MemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if _psapi.GetProcessMemoryInfo(_kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class GcWatcher:
+    # Times every collection through gc.callbacks. The callback runs wherever
+    # the interpreter decides to collect, possibly while that thread holds a
+    # metric or logging lock, so it must not take any lock itself: it only
+    # appends to a deque. flush() (at scrape time, from the soak monitor) hands
+    # the pauses to on_pause(generation, seconds, collected) and the totals.
+    # Collections hold the GIL and never overlap, so one start time is enough.
+    def __init__(self, on_pause=None):
+        self.on_pause = on_pause
+        self.started = 0.0
+        self.pending = deque(maxlen=100000) # (generation, seconds, collected) not yet flushed
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0 # Longest pause since the last take_worst()
+        self.lock = threading.Lock() # Serializes flush(); never taken in the callback
+
+    def install(self):
+        if self.callback not in gc.callbacks:
+            gc.callbacks.append(self.callback)
+
+    def uninstall(self):
+        if self.callback in gc.callbacks:
+            gc.callbacks.remove(self.callback)
+
+    def callback(self, phase, info):
+        if phase == 'start':
+            self.started = time.perf_counter()
+        else:
+            self.pending.append((info['generation'], time.perf_counter() - self.started, info['collected']))
+
+    def flush(self):
+        with self.lock:
+            # Only what is queued now: handling a pause allocates, which can queue more
+            for i in range(len(self.pending)):
+                generation, seconds, collected = self.pending.popleft()
+                self.count += 1
+                self.total += seconds
+                self.worst = max(self.worst, seconds)
+                if self.on_pause:
+                    self.on_pause(generation, seconds, collected)
+
+    def take_worst(self):
+        self.flush()
+        with self.lock:
+            worst, self.worst = self.worst, 0.0
+        return worst
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import struct
+import threading
+
+# Compact binary log of everything clients send, for replaying real traffic
+# with server/replay.py. There is no framing on the wire, so a record is one
+# recv() chunk, i.e. exactly what handle_client parses as a message.
+#
+# File: HEADER, then EVENT records each followed by `length` payload bytes.
+# CONNECT carries the peer address, DATA the raw bytes, DISCONNECT nothing.
+# Sessions already connected when recording starts get their CONNECT on
+# their first message.
+#
+# Nothing secret is written: ADMIN messages are left out, passwords are
+# replaced with PASSWORD_PLACEHOLDER, and chunks that are not one JSON object
+# (possibly a fragment of a login) keep their length but not their content.
+# The file is owner-only all the same.
+
+MAGIC = b'GREC'
+VERSION = 1
+HEADER = struct.Struct('<4sHd') # magic, version, start (epoch seconds)
+EVENT = struct.Struct('<dIBI') # seconds since start, session id, kind, payload length
+CONNECT, DATA, DISCONNECT = 0, 1, 2
+PASSWORD_PLACEHOLDER = 'replay'
+
+def redact(data):
+    # Payload to record for one chunk, or None to leave it out
+    try:
+        msg = json.loads(data.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError):
+        return b' ' * len(data) # Still invalid JSON on replay
+    if not isinstance(msg, dict):
+        return b' ' * len(data)
+    if msg.get('type') == 'ADMIN':
+        return None
+    if 'password' in msg:
+        msg['password'] = PASSWORD_PLACEHOLDER
+        return json.dumps(msg).encode('utf-8')
+    return data
+
+class SessionRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.start = time.time()
+        self.t0 = time.perf_counter()
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        self.file = os.fdopen(fd, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.start))
+        self.sessions = {} # addr_str -> session id
+        self.events = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def write(self, session, kind, payload):
+        # Caller holds the lock
+        self.file.write(EVENT.pack(time.perf_counter() - self.t0, session, kind, len(payload)))
+        self.file.write(payload)
+        self.events += 1
+        self.bytes += EVENT.size + len(payload)
+
+    def record(self, addr_str, data):
+        data = redact(data)
+        if data is None:
+            return
+        with self.lock:
+            if self.closed:
+                return
+            session = self.sessions.get(addr_str)
+            if session is None:
+                session = self.sessions[addr_str] = len(self.sessions) + 1
+                self.write(session, CONNECT, addr_str.encode('utf-8'))
+            self.write(session, DATA, data)
+
+    def disconnect(self, addr_str):
+        with self.lock:
+            if self.closed:
+                return
+            session = self.sessions.pop(addr_str, None)
+            if session is not None:
+                self.write(session, DISCONNECT, b'')
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.file.close()
+
+    def status(self):
+        return {"path": self.path, "events": self.events, "bytes": self.bytes,
+                "seconds": round(time.perf_counter() - self.t0, 1)}
+
+def read_recording(path):
+    # Yields (seconds since start, session id, kind, payload); stops quietly at a
+    # truncated tail (e.g. the server was killed mid-write)
+    with open(path, 'rb') as f:
+        magic, version, start = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} session recording")
+        while True:
+            head = f.read(EVENT.size)
+            if len(head) < EVENT.size:
+                return
+            t, session, kind, length = EVENT.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            yield t, session, kind, payload
@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+# Replays a session recording (see recorder.py / admin.py record_start) through
+# the server's handlers in one thread, in recorded order, with fake sockets.
+#
+#   python server/replay.py session.rec                  # as fast as possible
+#   python server/replay.py session.rec --speed 1        # original timing (2 = twice as fast)
+#   python server/replay.py session.rec --repeat 5
+#
+# Replays run against a throwaway DB, and it should start fresh (the default):
+# recordings hold no passwords, every one is recorder.PASSWORD_PLACEHOLDER, so
+# recorded logins only succeed for accounts registered in the same recording.
+# With --db pointing at a copy of game_data.db they all fail.
+#
+# Handler time per message type is the benchmark; the digest of everything the
+# server sent back is the regression check (same recording + same code = same digest).
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import server
+from recorder import read_recording, CONNECT, DATA, DISCONNECT
+
+class ReplayConn:
+    # Collects what the server sends to one session
+    def __init__(self, digest):
+        self.digest = digest
+        self.bytes_sent = 0
+        self.sends = 0
+
+    def send(self, data):
+        self.digest.update(data)
+        self.bytes_sent += len(data)
+        self.sends += 1
+        return len(data)
+
+    def close(self):
+        pass
+
+def message_type(payload):
+    try:
+        msg_type = json.loads(payload).get('type')
+        return msg_type if msg_type in server.MESSAGE_TYPES else 'other'
+    except (ValueError, AttributeError):
+        return 'invalid'
+
+def replay(events, speed=0.0, db=None):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    if db:
+        shutil.copyfile(db, path)
+    db_path = server.DB_PATH
+    server.DB_PATH = path
+    server.clients.clear()
+    digest = hashlib.sha1()
+    sessions = {} # session id -> (conn, addr, addr_str)
+    conns = []
+    times = {} # message type -> [seconds]
+    errors = 0
+    try:
+        server.init_db()
+        start = time.perf_counter()
+        for t, session, kind, payload in events:
+            if speed:
+                delay = t / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            if kind == CONNECT:
+                # Not the recorded address: replayed ADMIN messages must not pass the localhost check
+                addr = ('replay', session)
+                conn = ReplayConn(digest)
+                conns.append(conn)
+                sessions[session] = (conn, addr, str(addr))
+                server.open_session(conn, str(addr))
+            elif kind == DATA and session in sessions:
+                conn, addr, addr_str = sessions[session]
+                msg_type = message_type(payload)
+                t0 = time.perf_counter()
+                try:
+                    server.handle_data(payload, conn, addr, addr_str)
+                except Exception:
+                    # The live server drops the connection here
+                    errors += 1
+                    server.close_session(addr_str)
+                    del sessions[session]
+                times.setdefault(msg_type, []).append(time.perf_counter() - t0)
+            elif kind == DISCONNECT and session in sessions:
+                server.close_session(sessions.pop(session)[2])
+        wall = time.perf_counter() - start
+    finally:
+        server.clients.clear()
+        server.DB_PATH = db_path
+        os.remove(path)
+
+    by_type = {}
+    for msg_type, values in sorted(times.items()):
+        values.sort()
+        by_type[msg_type] = {
+            "count": len(values),
+            "total_ms": round(sum(values) * 1000, 3),
+            "median_us": round(values[len(values) // 2] * 1e6, 2),
+            "p95_us": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1e6, 2),
+        }
+    return {
+        "wall_s": round(wall, 3),
+        "handler_s": round(sum(sum(v) for v in times.values()), 4),
+        "messages": sum(len(v) for v in times.values()),
+        "errors": errors,
+        "sends": sum(c.sends for c in conns),
+        "bytes_sent": sum(c.bytes_sent for c in conns),
+        "digest": digest.hexdigest(),
+        "by_type": by_type,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a session recording through the server handlers")
+    parser.add_argument('recording')
+    parser.add_argument('--speed', type=float, default=0.0, help="1 = original timing, 0 = as fast as possible")
+    parser.add_argument('--db', help="Replay against a copy of this database (logins fail unless its passwords are the placeholder)")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--json', help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    events = list(read_recording(args.recording))
+    sessions = len({session for t, session, kind, payload in events})
+    span = events[-1][0] if events else 0.0
+    print(f"{args.recording}: {len(events)} events, {sessions} sessions, {span:.1f} s recorded")
+
+    runs = []
+    for i in range(args.repeat):
+        result = replay(events, args.speed, args.db)
+        runs.append(result)
+        print(f"run {i + 1}: {result['messages']} messages in {result['wall_s']:.3f} s "
+              f"(handlers {result['handler_s']:.3f} s), {result['sends']} sends, "
+              f"{result['errors']} errors, digest {result['digest'][:12]}")
+    if len({r['digest'] for r in runs}) > 1:
+        print("WARNING: replays produced different output")
+
+    best = min(runs, key=lambda r: r['handler_s'])
+    print(f"{'type':18s} {'count':>8s} {'total ms':>10s} {'median us':>10s} {'p95 us':>10s}   (fastest run)")
+    for msg_type, r in best['by_type'].items():
+        print(f"{msg_type:18s} {r['count']:8d} {r['total_ms']:10.2f} {r['median_us']:10.2f} {r['p95_us']:10.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"recording": args.recording, "speed": args.speed, "runs": runs}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
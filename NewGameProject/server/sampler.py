@@ -0,0 +1,112 @@
+import os
+import re
+import sys
+import time
+import threading
+
+# Statistical profiler for the live server: a daemon thread wakes every
+# `interval` seconds, grabs every other thread's stack with sys._current_frames()
+# and counts identical stacks. Output is the collapsed-stack format used by
+# flamegraph.pl / speedscope ("root;caller;callee count" per line).
+
+MAX_DEPTH = 64
+MIN_INTERVAL = 0.001 # Faster than this the sampler thread starves the game loop of the GIL
+MAX_INTERVAL = 1.0
+
+def frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+class SamplingProfiler:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.counts = {} # stack tuple (root first) -> samples
+        self.samples = 0
+        self.sample_seconds = 0.0 # Time spent inside sampling, i.e. the overhead
+        self.started_at = None
+        self.stopped_at = None
+        self.thread = None
+        self.running = False
+        self.lock = threading.Lock()
+
+    def start(self, interval=None):
+        # Raises ValueError/TypeError for an interval outside MIN_INTERVAL..MAX_INTERVAL
+        interval = self.interval if interval is None else float(interval)
+        if not MIN_INTERVAL <= interval <= MAX_INTERVAL:
+            raise ValueError(f"interval must be between {MIN_INTERVAL} and {MAX_INTERVAL} seconds")
+        with self.lock:
+            if self.running:
+                return False
+            self.interval = interval
+            self.counts = {}
+            self.samples = 0
+            self.sample_seconds = 0.0
+            self.started_at = time.time()
+            self.stopped_at = None
+            self.running = True
+            self.thread = threading.Thread(target=self.run, name="sampler", daemon=True)
+            self.thread.start()
+        return True
+
+    def stop(self):
+        with self.lock:
+            if not self.running:
+                return False
+            self.running = False
+            thread, self.thread = self.thread, None
+        # Join outside the lock: the sampler thread takes it every sample
+        thread.join()
+        with self.lock:
+            self.stopped_at = time.time()
+        return True
+
+    def run(self):
+        own = threading.get_ident()
+        while self.running:
+            t = time.perf_counter()
+            self.sample(own)
+            spent = time.perf_counter() - t
+            with self.lock:
+                self.sample_seconds += spent
+            time.sleep(max(0.0, self.interval - spent))
+
+    def sample(self, own):
+        # Connection threads are named "Thread-N (handle_client)"; drop the N so
+        # all of them merge into one root in the flame graph
+        names = {t.ident: re.sub(r'-\d+', '', t.name) for t in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, "thread"))
+            stack.reverse()
+            stacks.append(tuple(stack))
+        with self.lock:
+            for stack in stacks:
+                self.counts[stack] = self.counts.get(stack, 0) + 1
+            self.samples += 1
+
+    def collapsed(self):
+        with self.lock:
+            items = sorted(self.counts.items(), key=lambda kv: -kv[1])
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in items)
+
+    def dump(self, path=None):
+        path = path or time.strftime("profile_%Y%m%d_%H%M%S.folded")
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+        return path
+
+    def status(self):
+        with self.lock:
+            return {
+                "running": self.running,
+                "interval": self.interval,
+                "samples": self.samples,
+                "stacks": len(self.counts),
+                "overhead_s": round(self.sample_seconds, 4),
+                "seconds": round((self.stopped_at or time.time()) - self.started_at, 1) if self.started_at else 0.0,
+            }
@@ -1,15 +1,44 @@
+import os
+import sys
 import socket
 import threading
 import json
 import sqlite3
 import hashlib
+import hmac
+import secrets
+import time
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common')) # Shared with the client (logsetup.py)
+from metrics import REGISTRY, start_http_server
+from sampler import SamplingProfiler
+from logsetup import setup_logging, kv
+from recorder import SessionRecorder
+from procstats import GcWatcher, cpu_seconds, rss_bytes
 
 HOST = '0.0.0.0'
 PORT = 5555
+DB_PATH = 'game_data.db'
+METRICS_PORT = 9100 # Prometheus /metrics on localhost (0 = off)
+RECORD_PATH = None # Record all inbound traffic from startup to this file (see server/replay.py)
+SOAK_INTERVAL = 10 # Seconds between resource log lines with --soak
+LOG_PATH = 'server.log' # Also logged to the console (None = console only)
+ADMIN_HOSTS = ('127.0.0.1', '::1') # ADMIN messages are only accepted from these addresses
+# ADMIN messages must carry this as 'token'. Without GAME_ADMIN_TOKEN the server makes one
+# at startup and writes it to ADMIN_TOKEN_FILE (owner-only), where admin.py picks it up.
+ADMIN_TOKEN = os.environ.get('GAME_ADMIN_TOKEN', '')
+ADMIN_TOKEN_FILE = 'admin_token'
+ADMIN_OUTPUT_DIR = 'admin_output' # Profiles and recordings requested over ADMIN are written here, nowhere else
+
+log = logging.getLogger('server')
+net_log = logging.getLogger('server.net')
+db_log = logging.getLogger('server.db')
+admin_log = logging.getLogger('server.admin')
 
 # Database Setup
 def init_db():
-    conn = sqlite3.connect('game_data.db')
+    conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS users 
                  (username TEXT PRIMARY KEY, password TEXT)''')
@@ -18,25 +47,53 @@ def init_db():
     conn.commit()
     conn.close()
 
-init_db()
+clients = {} # {addr_str: {'conn': conn, 'pos': {'x': 0, 'y': 0}, 'username': None, 'appearance': {}}}
 
-server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-server.bind((HOST, PORT))
-server.listen()
+# Metrics (rates such as messages/s come from the counters via rate() in Prometheus)
+MESSAGE_TYPES = ('LOGIN', 'REGISTER', 'CREATE_CHARACTER', 'MOVE', 'ADMIN') # Anything else is counted as 'other'
+SESSIONS = REGISTRY.gauge('server_sessions', 'Connected sockets', fn=lambda: len(clients))
+PLAYERS = REGISTRY.gauge('server_players', 'Logged-in sessions',
+                         fn=lambda: sum(1 for c in list(clients.values()) if c.get('username')))
+THREADS = REGISTRY.gauge('server_threads', 'Live threads (one per connection plus accept/metrics)', fn=threading.active_count)
+MESSAGES = REGISTRY.counter('server_messages_received_total', 'Messages received by type', ('type',))
+BYTES_IN = REGISTRY.counter('server_bytes_received_total', 'Bytes received from clients')
+BYTES_OUT = REGISTRY.counter('server_bytes_sent_total', 'Bytes sent to clients')
+SEND_ERRORS = REGISTRY.counter('server_send_errors_total', 'Failed sends (dropped broadcasts)')
+# Sends go straight to the socket (no per-client queue), so the closest thing to a
+# queue depth is how many threads are stuck sending to slow receivers
+SENDS_IN_FLIGHT = REGISTRY.gauge('server_sends_in_flight', 'Threads currently sending (a whole broadcast counts once)')
+BROADCAST_SECONDS = REGISTRY.histogram('server_broadcast_seconds', 'Time to build and fan out one GAME_STATE')
+BROADCAST_FANOUT = REGISTRY.histogram('server_broadcast_fanout', 'Recipients per GAME_STATE broadcast',
+                                      buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500))
+DB_SECONDS = REGISTRY.histogram('server_db_query_seconds', 'SQLite query latency (connect to close)', ('query',))
+CPU = REGISTRY.gauge('server_process_cpu_seconds', 'CPU time used by the process (user + system)', fn=cpu_seconds)
+RSS = REGISTRY.gauge('server_process_rss_bytes', 'Resident memory', fn=rss_bytes)
+GC_PAUSES = REGISTRY.histogram('server_gc_pause_seconds', 'Garbage collector pauses (every thread stops)', ('generation',),
+                               buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+GC_WATCHER = GcWatcher(lambda generation, seconds, collected: GC_PAUSES.observe(seconds, generation))
+REGISTRY.add_collector(GC_WATCHER.flush) # Pauses reach the histogram at scrape time, never from inside a collection
 
-print(f"Server started on {HOST}:{PORT}")
+def send_raw(conn, data):
+    SENDS_IN_FLIGHT.inc()
+    try:
+        conn.send(data)
+    finally:
+        SENDS_IN_FLIGHT.dec()
+    BYTES_OUT.inc(amount=len(data))
 
-clients = {} # {addr_str: {'conn': conn, 'pos': {'x': 0, 'y': 0}, 'username': None, 'appearance': {}}}
+def send_json(conn, msg):
+    send_raw(conn, json.dumps(msg).encode('utf-8'))
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def get_character(username):
-    db = sqlite3.connect('game_data.db')
-    c = db.cursor()
-    c.execute("SELECT body, hair, shirt, pants, eyes FROM characters WHERE username = ?", (username,))
-    row = c.fetchone()
-    db.close()
+    with DB_SECONDS.time('get_character'):
+        db = sqlite3.connect(DB_PATH)
+        c = db.cursor()
+        c.execute("SELECT body, hair, shirt, pants, eyes FROM characters WHERE username = ?", (username,))
+        row = c.fetchone()
+        db.close()
     if row:
         return {"body": row[0], "hair": row[1], "shirt": row[2], "pants": row[3], "eyes": row[4]}
     return None
@@ -45,11 +102,12 @@ def handle_login(data, conn, addr_str):
     username = data.get('username')
     password = data.get('password')
     
-    db = sqlite3.connect('game_data.db')
-    c = db.cursor()
-    c.execute("SELECT password FROM users WHERE username = ?", (username,))
-    row = c.fetchone()
-    db.close()
+    with DB_SECONDS.time('login'):
+        db = sqlite3.connect(DB_PATH)
+        c = db.cursor()
+        c.execute("SELECT password FROM users WHERE username = ?", (username,))
+        row = c.fetchone()
+        db.close()
     
     if row and row[0] == hash_password(password):
         clients[addr_str]['username'] = username
@@ -60,15 +118,15 @@ def handle_login(data, conn, addr_str):
         if has_char:
             clients[addr_str]['appearance'] = char_data
             
-        conn.send(json.dumps({
+        send_json(conn, {
             "type": "LOGIN_SUCCESS", 
             "username": username,
             "has_character": has_char,
             "appearance": char_data
-        }).encode('utf-8'))
+        })
         return True
     else:
-        conn.send(json.dumps({"type": "LOGIN_FAIL", "message": "Invalid credentials"}).encode('utf-8'))
+        send_json(conn, {"type": "LOGIN_FAIL", "message": "Invalid credentials"})
         return False
 
 def handle_create_character(data, conn, addr_str):
@@ -80,98 +138,262 @@ def handle_create_character(data, conn, addr_str):
     if not appearance:
         return
 
-    db = sqlite3.connect('game_data.db')
+    start = time.perf_counter()
+    db = sqlite3.connect(DB_PATH)
     c = db.cursor()
     try:
         c.execute("INSERT OR REPLACE INTO characters (username, body, hair, shirt, pants, eyes) VALUES (?, ?, ?, ?, ?, ?)",
                   (username, appearance['body'], appearance['hair'], appearance['shirt'], appearance['pants'], appearance['eyes']))
         db.commit()
-        
-        clients[addr_str]['appearance'] = appearance
-        conn.send(json.dumps({"type": "CREATE_CHAR_SUCCESS", "appearance": appearance}).encode('utf-8'))
+        ok = True
     except Exception as e:
-        print(f"Error creating char: {e}")
-        conn.send(json.dumps({"type": "CREATE_CHAR_FAIL"}).encode('utf-8'))
+        db_log.error("Character save failed", extra=kv(user=username, error=e))
+        ok = False
     finally:
         db.close()
+        DB_SECONDS.observe(time.perf_counter() - start, 'create_character')
+    if ok:
+        clients[addr_str]['appearance'] = appearance
+        send_json(conn, {"type": "CREATE_CHAR_SUCCESS", "appearance": appearance})
+    else:
+        send_json(conn, {"type": "CREATE_CHAR_FAIL"})
 
 def handle_register(data, conn):
     username = data.get('username')
     password = data.get('password')
     
     if not username or not password:
-        conn.send(json.dumps({"type": "REGISTER_FAIL", "message": "Missing info"}).encode('utf-8'))
+        send_json(conn, {"type": "REGISTER_FAIL", "message": "Missing info"})
         return
 
-    db = sqlite3.connect('game_data.db')
+    start = time.perf_counter()
+    db = sqlite3.connect(DB_PATH)
     c = db.cursor()
     try:
         c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hash_password(password)))
         db.commit()
-        conn.send(json.dumps({"type": "REGISTER_SUCCESS"}).encode('utf-8'))
+        ok = True
     except sqlite3.IntegrityError:
-        conn.send(json.dumps({"type": "REGISTER_FAIL", "message": "Username taken"}).encode('utf-8'))
+        ok = False
     finally:
         db.close()
+        DB_SECONDS.observe(time.perf_counter() - start, 'register')
+    if ok:
+        send_json(conn, {"type": "REGISTER_SUCCESS"})
+    else:
+        send_json(conn, {"type": "REGISTER_FAIL", "message": "Username taken"})
 
 def broadcast_state(sender_addr):
+    start = time.perf_counter()
+    # Snapshot: other connection threads add/remove clients while we iterate
+    sessions = list(clients.items())
+    
     # Only send positions of logged-in users with characters
     state = {}
-    for k, v in clients.items():
+    for k, v in sessions:
         if v.get('username') and v.get('appearance'):
             state[k] = {'pos': v['pos'], 'appearance': v['appearance'], 'username': v['username']}
             
-    data = json.dumps({"type": "GAME_STATE", "data": state})
+    data = json.dumps({"type": "GAME_STATE", "data": state}).encode('utf-8')
     
-    for client_addr, client_data in clients.items():
+    # Metrics are updated once per broadcast, not per recipient, to keep the fan-out loop lean
+    fanout = errors = 0
+    SENDS_IN_FLIGHT.inc()
+    for client_addr, client_data in sessions:
         if client_data.get('username'): 
+            fanout += 1
             try:
-                client_data['conn'].send(data.encode('utf-8'))
-            except:
-                pass
+                client_data['conn'].send(data)
+            except Exception as e:
+                errors += 1
+                net_log.warning("Broadcast send failed", extra=kv(peer=client_addr, error=e))
+    SENDS_IN_FLIGHT.dec()
+    BYTES_OUT.inc(amount=len(data) * (fanout - errors))
+    if errors:
+        SEND_ERRORS.inc(amount=errors)
+    BROADCAST_FANOUT.observe(fanout)
+    BROADCAST_SECONDS.observe(time.perf_counter() - start)
+
+# Sampling profiler and traffic recorder, started/stopped at runtime with ADMIN messages (see server/admin.py)
+PROFILER = SamplingProfiler()
+RECORDER = None
+
+def init_admin_token():
+    global ADMIN_TOKEN
+    if ADMIN_TOKEN:
+        return
+    ADMIN_TOKEN = secrets.token_hex(16)
+    fd = os.open(ADMIN_TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(ADMIN_TOKEN)
+
+def admin_output_path(name, extension):
+    # Admin-chosen file names must be plain names with the expected extension;
+    # they always land in ADMIN_OUTPUT_DIR. Returns None for anything else.
+    if (not isinstance(name, str) or not name.endswith(extension) or name.startswith('.')
+            or os.path.basename(name) != name or any(ch in name for ch in '/\\:')):
+        return None
+    os.makedirs(ADMIN_OUTPUT_DIR, exist_ok=True)
+    return os.path.join(ADMIN_OUTPUT_DIR, name)
+
+def handle_admin(data, conn, addr):
+    token = data.get('token')
+    if (addr[0] not in ADMIN_HOSTS or not ADMIN_TOKEN or not isinstance(token, str)
+            or not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))):
+        send_json(conn, {"type": "ADMIN_RESULT", "ok": False, "error": "not allowed"})
+        return
+    command = data.get('command')
+    reply = {"type": "ADMIN_RESULT", "ok": True, "command": command}
+    if command == 'profile_start':
+        try:
+            reply['ok'] = PROFILER.start(data.get('interval'))
+        except (TypeError, ValueError) as e:
+            reply.update(ok=False, error=f"bad interval: {e}")
+    elif command in ('profile_stop', 'profile_dump'):
+        # profile_dump snapshots without stopping
+        path = admin_output_path(data.get('path') or time.strftime("profile_%Y%m%d_%H%M%S.folded"), '.folded')
+        if not path:
+            reply.update(ok=False, error="path must be a plain file name ending in .folded")
+        elif command == 'profile_stop' and not PROFILER.stop():
+            reply['ok'] = False
+        else:
+            reply['path'] = PROFILER.dump(path)
+            admin_log.info("Profile written", extra=kv(path=path, samples=PROFILER.samples))
+    elif command == 'record_start':
+        path = admin_output_path(data.get('path') or time.strftime("session_%Y%m%d_%H%M%S.rec"), '.rec')
+        if path:
+            reply['ok'] = start_recording(path)
+        else:
+            reply.update(ok=False, error="path must be a plain file name ending in .rec")
+    elif command == 'record_stop':
+        stopped = stop_recording()
+        reply['ok'] = stopped is not None
+        if stopped:
+            reply['path'] = stopped['path']
+    elif command not in ('profile_status', 'record_status'):
+        reply.update(ok=False, error=f"unknown command {command!r}")
+    reply['profile'] = PROFILER.status()
+    reply['recording'] = RECORDER.status() if RECORDER else None
+    send_json(conn, reply)
+
+def start_recording(path):
+    # path is trusted here: RECORD_PATH, or an ADMIN name already checked by admin_output_path()
+    global RECORDER
+    if RECORDER:
+        return False
+    RECORDER = SessionRecorder(path)
+    admin_log.info("Recording started", extra=kv(path=RECORDER.path))
+    return True
+
+def stop_recording():
+    global RECORDER
+    recorder, RECORDER = RECORDER, None
+    if not recorder:
+        return None
+    recorder.close()
+    status = recorder.status()
+    admin_log.info("Recording stopped", extra=kv(**status))
+    return status
+
+def open_session(conn, addr_str):
+    clients[addr_str] = {'conn': conn, 'pos': {'x': 400, 'y': 300}, 'username': None, 'appearance': None}
+
+def close_session(addr_str):
+    if addr_str in clients:
+        del clients[addr_str]
+
+def handle_data(data_raw, conn, addr, addr_str):
+    # One recv() worth of bytes from a session; split out of handle_client so
+    # replay.py can drive the same code without sockets or threads
+    BYTES_IN.inc(amount=len(data_raw))
+    data_raw = data_raw.decode('utf-8')
+    
+    try:
+        msg = json.loads(data_raw)
+        msg_type = msg.get('type')
+        MESSAGES.inc(msg_type if msg_type in MESSAGE_TYPES else 'other')
+        
+        if msg_type == 'LOGIN':
+            if handle_login(msg, conn, addr_str):
+                log.info("Logged in", extra=kv(user=clients[addr_str]['username'], peer=addr_str))
+        
+        elif msg_type == 'REGISTER':
+            handle_register(msg, conn)
+        
+        elif msg_type == 'CREATE_CHARACTER':
+            handle_create_character(msg, conn, addr_str)
+        
+        elif msg_type == 'MOVE':
+            if clients[addr_str]['username']: 
+                clients[addr_str]['pos'] = msg.get('pos')
+                broadcast_state(addr_str)
+        
+        elif msg_type == 'ADMIN':
+            handle_admin(msg, conn, addr)
+                
+    except json.JSONDecodeError:
+        MESSAGES.inc('invalid')
+        net_log.debug("Invalid message", extra=kv(peer=addr_str, size=len(data_raw)))
 
 def handle_client(conn, addr):
-    print(f"New connection: {addr}")
     addr_str = str(addr)
-    clients[addr_str] = {'conn': conn, 'pos': {'x': 400, 'y': 300}, 'username': None, 'appearance': None}
+    net_log.info("Connected", extra=kv(peer=addr_str))
+    open_session(conn, addr_str)
     
     try:
         while True:
-            data_raw = conn.recv(4096).decode('utf-8')
+            data_raw = conn.recv(4096)
             if not data_raw:
                 break
-            
-            try:
-                msg = json.loads(data_raw)
-                msg_type = msg.get('type')
-                
-                if msg_type == 'LOGIN':
-                    if handle_login(msg, conn, addr_str):
-                        print(f"{clients[addr_str]['username']} logged in.")
-                
-                elif msg_type == 'REGISTER':
-                    handle_register(msg, conn)
-                
-                elif msg_type == 'CREATE_CHARACTER':
-                    handle_create_character(msg, conn, addr_str)
-                
-                elif msg_type == 'MOVE':
-                    if clients[addr_str]['username']: 
-                        clients[addr_str]['pos'] = msg.get('pos')
-                        broadcast_state(addr_str)
-                        
-            except json.JSONDecodeError:
-                pass
+            recorder = RECORDER # Local: an ADMIN message may stop it from another thread
+            if recorder:
+                recorder.record(addr_str, data_raw)
+            handle_data(data_raw, conn, addr, addr_str)
                 
     except Exception as e:
-        print(f"Error: {e}")
+        net_log.error("Connection error", extra=kv(peer=addr_str, error=e))
     finally:
-        print(f"Disconnected: {addr}")
-        if addr_str in clients:
-            del clients[addr_str]
+        net_log.info("Disconnected", extra=kv(peer=addr_str))
+        recorder = RECORDER
+        if recorder:
+            recorder.disconnect(addr_str)
+        close_session(addr_str)
         conn.close()
 
+def soak_monitor(interval):
+    # --soak: one resource line per interval, so a long run leaves a time series in server.log
+    last_cpu, last_time, last_gc = cpu_seconds(), time.perf_counter(), GC_WATCHER.count
+    while True:
+        time.sleep(interval)
+        worst = GC_WATCHER.take_worst() # Flushes pending pauses first
+        cpu, now, gcs, rss = cpu_seconds(), time.perf_counter(), GC_WATCHER.count, rss_bytes()
+        log.info("Soak", extra=kv(sessions=len(clients), players=PLAYERS.fn(), threads=threading.active_count(),
+                                  cpu_pct=round((cpu - last_cpu) / (now - last_time) * 100, 1),
+                                  rss_mb=round(rss / 2**20, 1) if rss is not None else "unavailable", gc_runs=gcs - last_gc,
+                                  gc_worst_ms=round(worst * 1000, 2)))
+        last_cpu, last_time, last_gc = cpu, now, gcs
+
 def main():
+    # Socket and DB are set up here rather than at import, so tools
+    # (bench_server.py) can import the handlers without starting a server
+    setup_logging(LOG_PATH)
+    init_admin_token()
+    init_db()
+    if RECORD_PATH:
+        start_recording(RECORD_PATH)
+    GC_WATCHER.install()
+    if "--soak" in sys.argv:
+        threading.Thread(target=soak_monitor, args=(SOAK_INTERVAL,), name="soak", daemon=True).start()
+    
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind((HOST, PORT))
+    server.listen()
+    
+    log.info("Server started", extra=kv(host=HOST, port=PORT))
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+        log.info("Metrics enabled", extra=kv(url=f"http://127.0.0.1:{METRICS_PORT}/metrics"))
+    
     while True:
         conn, addr = server.accept()
         thread = threading.Thread(target=handle_client, args=(conn, addr))